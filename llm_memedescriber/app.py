@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
 from fastapi.responses import HTMLResponse, StreamingResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
@@ -16,11 +16,11 @@ from .config import load_settings, configure_logging, parse_interval
 from .constants import *
 from .constants import _get_extension
 from .db import init_db, get_stats, get_meme_by_filename
-from .main import App
+from .main import App, _norm_kw
 from .storage import WebDavStorage
 from .storage_workers import StorageWorkerPool
 from .genai_client import get_client
-from .search import rebuild_index, add_meme_to_index, search_memes as whoosh_search
+from .search import rebuild_index, add_meme_to_index, close_index_writer, search_memes as whoosh_search
 from .deduplication import (
     find_duplicate_groups,
     mark_false_positive,
@@ -31,13 +31,13 @@ from .deduplication import (
     list_pair_exceptions,
 )
 from .dup_helpers import get_group_members, get_groups_for_filename
-from .storage_helpers import compute_and_persist_phash
-from .preview_helpers import generate_preview, async_generate_preview, restore_preview_cache, save_preview_cache, cleanup_orphaned_cache
+from .storage_helpers import compute_and_persist_phash, compute_and_persist_phashes
+from .preview_helpers import generate_preview, async_generate_preview, restore_preview_cache, save_preview_cache, cleanup_orphaned_cache, prefetch_previews, shutdown_preview_pool, _cache_path
 from sqlmodel import select
 from .db_helpers import session_scope
 from .models import Meme, DuplicateGroup as DBDuplicateGroup, MemeDuplicateGroup as DBDupeLink
 import datetime
-from sqlalchemy import text
+from sqlalchemy import func, text
 
 logger = logging.getLogger(__name__)
 
@@ -83,11 +83,11 @@ async def lifespan(app_instance: FastAPI):
     storage = None
     if getattr(settings, 'webdav_url', None):
         base_url = settings.webdav_url.rstrip('/') + '/' + settings.webdav_path.lstrip('/')
-        base_storage = WebDavStorage(base_url, auth=(settings.webdav_username, settings.webdav_password))
         try:
             storage_workers = int(getattr(settings, 'storage_workers', DEFAULT_STORAGE_WORKERS) or DEFAULT_STORAGE_WORKERS)
         except Exception:
             storage_workers = DEFAULT_STORAGE_WORKERS
+        base_storage = WebDavStorage(base_url, auth=(settings.webdav_username, settings.webdav_password), max_connections=storage_workers)
         try:
             storage_concurrency = int(getattr(settings, 'storage_concurrency', DEFAULT_STORAGE_CONCURRENCY) or DEFAULT_STORAGE_CONCURRENCY)
         except Exception:
@@ -144,22 +144,13 @@ async def lifespan(app_instance: FastAPI):
                 successful = 0
                 failed = 0
 
-                async def process_phash(filename: str) -> bool:
-                    try:
-                        result = await compute_and_persist_phash(filename, storage, app_instance.state.engine, timestamp=1.0)
-                        return result is not None
-                    except Exception:
-                        logger.exception("Exception while processing phash for %s", filename)
-                        return False
-
                 try:
-                    tasks = [asyncio.create_task(process_phash(fn)) for fn in filenames]
-                    results = await asyncio.gather(*tasks)
-                    for r in results:
-                        if r:
-                            successful += 1
-                        else:
-                            failed += 1
+                    # Bound in-flight downloads so thousands of pending files don't all queue on the pool
+                    results = await compute_and_persist_phashes(
+                        filenames, storage, app_instance.state.engine, timestamp=1.0, concurrency=storage_concurrency
+                    )
+                    successful = sum(1 for r in results.values() if r is not None)
+                    failed = len(filenames) - successful
                 except Exception:
                     logger.exception("Error during async phash initialization")
 
@@ -239,6 +230,16 @@ async def lifespan(app_instance: FastAPI):
     except Exception:
         logger.exception("Failed to save preview cache on shutdown")
     
+    try:
+        close_index_writer()
+    except Exception:
+        logger.exception("Failed to flush search index on shutdown")
+
+    try:
+        shutdown_preview_pool()
+    except Exception:
+        logger.exception("Failed to stop preview encoder pool on shutdown")
+    
     try:
         if getattr(app_instance.state, 'app_instance', None):
             app_inst = app_instance.state.app_instance
@@ -304,9 +305,7 @@ app.state._started = False
 
 def _get_cache_path(filename: str) -> str:
     """Get safe cache file path from filename hash."""
-    import hashlib
-    name_hash = hashlib.md5(filename.encode()).hexdigest()
-    return os.path.join(CACHE_DIR, f"{name_hash}.jpg")
+    return _cache_path(filename)
 
 
 def _get_mime_type(ext: str) -> str:
@@ -416,8 +415,14 @@ def health_check():
 
 
 @app.get("/memes", tags=["memes"])
-def list_memes(limit: int = DEFAULT_LIST_LIMIT, offset: int = DEFAULT_OFFSET, status: Optional[str] = None, sort: str = "-created_at"):
-    """List memes with optional filtering and sorting (excludes removed)."""
+def list_memes(background_tasks: BackgroundTasks, limit: int = DEFAULT_LIST_LIMIT, offset: int = DEFAULT_OFFSET, status: Optional[str] = None, sort: str = "-created_at"):
+    """List memes with optional filtering and sorting (excludes removed).
+
+    Previews for the rows just past the returned page are prefetched after the
+    response is sent, so they are cached by the time the gallery scrolls there.
+    The page's own previews are left to the browser's requests, which would
+    otherwise race the prefetch and generate the same previews twice.
+    """
     logger.debug(f"list_memes called: limit={limit}, offset={offset}, status={status}, sort={sort}")
     
     try:
@@ -433,8 +438,10 @@ def list_memes(limit: int = DEFAULT_LIST_LIMIT, offset: int = DEFAULT_OFFSET, st
             else:
                 q = q.order_by(getattr(Meme, sort))
             
-            q = q.limit(limit).offset(offset)
+            # Also read the next PREVIEW_PREFETCH_RADIUS rows: they are what gets prefetched
+            q = q.limit(limit + PREVIEW_PREFETCH_RADIUS).offset(offset)
             rows = session.exec(q).all()
+            rows, upcoming = rows[:limit], rows[limit:]
             
             logger.debug(f"Query returned {len(rows)} rows")
             
@@ -448,6 +455,11 @@ def list_memes(limit: int = DEFAULT_LIST_LIMIT, offset: int = DEFAULT_OFFSET, st
                 result.append(meme_dict)
             
             logger.debug(f"Returning {len(result)} memes")
+            storage = getattr(app.state, 'app_instance', None) and getattr(app.state.app_instance, 'storage', None)
+            if storage:
+                names = [r.filename for r in upcoming if is_image(r.filename) or is_video(r.filename)]
+                if names:
+                    background_tasks.add_task(prefetch_previews, names, {n: is_video(n) for n in names}, storage, PREVIEW_SIZE)
             return result
     except Exception as e:
         logger.exception("Error in list_memes")
@@ -657,7 +669,7 @@ def get_duplicates_by_group():
                                 if file_entries and isinstance(file_entries[0], dict):
                                     entry = file_entries[0]
                                     logger.debug(f"WebDAV entry for {l.filename}: {entry}")
-                                    for size_field in ('getcontentlength', 'size'):
+                                    for size_field in ('getcontentlength', 'content_length', 'size'):
                                         if size_field in entry:
                                             try:
                                                 file_size = int(entry[size_field])
@@ -716,7 +728,7 @@ def search_memes(q: str = "", limit: int = DEFAULT_SEARCH_LIMIT, offset: int = D
     if not q or len(q) < MIN_SEARCH_QUERY_LENGTH:
         return []
     
-    results = whoosh_search(q, limit=limit + offset, offset=0)
+    results = whoosh_search(q, limit=limit + offset, offset=0, engine=app.state.engine)
     
     paginated_results = results[offset : offset + limit]
     
@@ -787,10 +799,8 @@ def force_description_generation(filename: str):
                     if m:
                         m.category = result.get('kategoria') or m.category
                         m.description = result.get('opis') or m.description
-                        kw = result.get('keywordy')
-                        if isinstance(kw, list):
-                            m.keywords = ','.join(kw)
-                        elif isinstance(kw, str):
+                        kw = _norm_kw(result.get('keywordy'))
+                        if kw is not None:
                             m.keywords = kw
                         m.text_in_image = result.get('tekst') or m.text_in_image
                         m.status = 'filled'
@@ -980,20 +990,28 @@ def get_meme_duplicates(filename: str):
             if not group_ids:
                 return {"primary": None, "duplicates": []}
 
-            duplicates_info = []
-            seen = set()
+            member_names = []
+            seen = {filename}
             for gid in group_ids:
-                members = get_group_members(session, gid)
-                for mem_fn in members:
-                    if mem_fn == filename or mem_fn in seen:
-                        continue
-                    seen.add(mem_fn)
-                    mem = session.exec(select(Meme).where(Meme.filename == mem_fn)).first()
-                    if mem and mem.phash and primary_meme.phash:
-                        distance = hamming_distance(primary_meme.phash, mem.phash)
-                    else:
-                        distance = 64
-                    duplicates_info.append(DuplicateInfo(filename=mem_fn, similarity=distance, preview_url=f"/memes/{mem_fn}/preview"))
+                for mem_fn in get_group_members(session, gid):
+                    if mem_fn not in seen:
+                        seen.add(mem_fn)
+                        member_names.append(mem_fn)
+
+            # Distances come from the SQLite `hamming` function over phash_bits in one query
+            distances = {}
+            if member_names and primary_meme.phash_bits is not None:
+                distances = dict(session.exec(
+                    select(Meme.filename, func.hamming(Meme.phash_bits, primary_meme.phash_bits))
+                    .where(Meme.filename.in_(member_names))
+                ).all())
+
+            duplicates_info = []
+            for mem_fn in member_names:
+                distance = distances.get(mem_fn)
+                if distance is None:
+                    distance = 64
+                duplicates_info.append(DuplicateInfo(filename=mem_fn, similarity=distance, preview_url=f"/memes/{mem_fn}/preview"))
 
             return {
                 "primary": DuplicateInfo(filename=primary_meme.filename, similarity=0, preview_url=f"/memes/{primary_meme.filename}/preview"),
@@ -8,6 +8,8 @@ from pydantic import field_validator, ValidationError
 from pydantic_settings import BaseSettings
 import logging
 
+from .constants import DEFAULT_MAX_UPLOAD_BYTES
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,6 +25,7 @@ class Settings(BaseSettings):
     timezone: str = "UTC"
     max_generation_attempts: int = 3
     auto_start_worker: bool = True
+    max_upload_bytes: int | None = DEFAULT_MAX_UPLOAD_BYTES
 
     @field_validator("run_interval")
     @classmethod
@@ -1,11 +1,15 @@
 """Global constants for file type definitions."""
 from urllib.parse import unquote
 
-IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "webp", "gif", "bmp", "tiff"}
-VIDEO_EXTENSIONS = {"mp4", "webm", "mov", "mkv", "avi", "flv"}
+IMAGE_EXTENSIONS = frozenset({"jpg", "jpeg", "png", "webp", "gif", "bmp", "tiff"})
+VIDEO_EXTENSIONS = frozenset({"mp4", "webm", "mov", "mkv", "avi", "flv"})
 SUPPORTED_EXTENSIONS = IMAGE_EXTENSIONS | VIDEO_EXTENSIONS
 
 INDEX_DIR = "/data/whoosh_index"
+REBUILD_FETCH_SIZE = 1000
+REBUILD_WRITER_LIMIT_MB = 256
+INDEX_WRITER_BUFFER_LIMIT = 200
+INDEX_WRITER_FLUSH_SECONDS = 2.0
 
 CACHE_DIR = "/data/cache"
 PREVIEW_CACHE_METADATA = "/data/cache/cache_manifest.json"
@@ -13,8 +17,14 @@ PREVIEW_CACHE_METADATA = "/data/cache/cache_manifest.json"
 PREVIEW_SIZE = 400
 PREVIEW_JPEG_QUALITY_IMAGE = 40
 PREVIEW_JPEG_QUALITY_VIDEO = 8
+PREVIEW_PREFETCH_RADIUS = 8
+PREVIEW_PREFETCH_CONCURRENCY = 4
+# Upper bound on preview encoder processes; each holds a full decoded image in memory
+PREVIEW_POOL_MAX_WORKERS = 4
 
 VIDEO_FRAME_TIMESTAMP = 1.0
+# pHash only looks at a 32x32 thumbnail; frames extracted for hashing are scaled down to this width
+PHASH_FRAME_MAX_DIM = 256
 VIDEO_EXTRACTION_TIMEOUT = 30
 
 MAX_FILENAME_LENGTH = 255
@@ -24,21 +34,40 @@ DEFAULT_LIST_LIMIT = 10000
 DEFAULT_SEARCH_LIMIT = 50
 DEFAULT_OFFSET = 0
 
-MAX_DB_RETRY_ATTEMPTS = 3
-INITIAL_DB_BACKOFF = 0.1
+MAX_DB_RETRY_ATTEMPTS = 2
+INITIAL_DB_BACKOFF = 0.05
+SQLITE_BUSY_TIMEOUT_MS = 5000
 
 MAX_WEBDAV_RETRY_ATTEMPTS = 3
 INITIAL_WEBDAV_BACKOFF = 0.5
 
 BATCH_PROCESS_WORKERS = 3
+DB_WRITE_BATCH_SIZE = 20
+# How long a generation thread waits for the DB writer to commit its description
+DB_SAVE_TIMEOUT_SECONDS = 30
+PHASH_PERSIST_BATCH_SIZE = 200
+# Newly listed images downloaded and hashed together during sync; bounds peak memory
+PHASH_DOWNLOAD_CHUNK_SIZE = 16
 DUPLICATE_THRESHOLD = 15
 
 DEFAULT_SYNC_MAX_RECORDS = None
+# SQLite's default SQLITE_MAX_VARIABLE_NUMBER before 3.32 (newer builds allow 32766); multi-row
+# INSERTs size their batches from this so they work on any SQLite version
+SQLITE_MAX_VARIABLES = 999
+# Bound parameters the listing upsert's ON CONFLICT clause adds on top of the row values
+LISTING_UPSERT_EXTRA_PARAMS = 8
+# Max filenames bound into one IN (...) clause; keeps queries under SQLite's variable limit
+SQL_IN_CHUNK_SIZE = 500
 
 DEFAULT_PREVIEW_WORKERS = 8
 
 DEFAULT_STORAGE_WORKERS = 6
 DEFAULT_STORAGE_CONCURRENCY = 2
+# Paths handled by one pool task in StorageWorkerPool.download_files/delete_files
+STORAGE_BULK_CHUNK_SIZE = 32
+
+# Largest file sent inline to the model; bigger files are marked 'oversize' and skipped
+DEFAULT_MAX_UPLOAD_BYTES = 100 * 1024 * 1024
 
 
 def _get_extension(filename: str) -> str:
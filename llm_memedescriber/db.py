@@ -2,11 +2,12 @@ import os
 from typing import Optional
 
 from sqlmodel import SQLModel, Session, create_engine, select
-from sqlalchemy import text
+from sqlalchemy import event, inspect, text
 import logging
 
 logger = logging.getLogger(__name__)
 
+from .constants import SQLITE_BUSY_TIMEOUT_MS
 from .models import Meme
 
 
@@ -22,19 +23,137 @@ def init_db(database_url: str = "sqlite:////data/memes.db"):
         pass
 
     engine = create_engine(database_url, echo=False, connect_args={"check_same_thread": False})
-    
+    # synchronous/busy_timeout/temp_store are per-connection, so apply them to every pooled connection
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(engine, "connect", _register_sqlite_functions)
     try:
-        with engine.connect() as conn:
-            conn.execute(text("PRAGMA journal_mode=WAL"))
-            conn.execute(text("PRAGMA synchronous=NORMAL"))
-            conn.execute(text("PRAGMA temp_store=MEMORY"))
+        # First connection switches the database file to WAL; surface failures early
+        with engine.connect():
+            pass
     except Exception as e:
         logger.debug("Unable to set SQLite pragmas: %s", e)
 
     SQLModel.metadata.create_all(engine)
+    _add_missing_columns(engine)
+    _canonicalize_duplicate_pairs(engine)
+    _add_missing_indexes(engine)
+    _backfill_phash_bits(engine)
     return engine
 
 
+def _set_sqlite_pragmas(dbapi_conn, _connection_record) -> None:
+    """Configure each new SQLite connection.
+
+    WAL lets readers run alongside the writer, and busy_timeout makes SQLite wait
+    for the write lock instead of failing immediately with "database is locked".
+    """
+    try:
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.close()
+    except Exception as e:
+        logger.debug("Unable to set SQLite pragmas: %s", e)
+
+
+def _register_sqlite_functions(dbapi_conn, _connection_record) -> None:
+    """Expose `hamming(a, b)` over `Meme.phash_bits` to SQL on each connection."""
+    from .deduplication import hamming_bits
+
+    try:
+        dbapi_conn.create_function("hamming", 2, hamming_bits, deterministic=True)
+    except Exception as e:
+        logger.debug("Unable to register SQLite functions: %s", e)
+
+
+def _add_missing_columns(engine) -> None:
+    """Add model columns missing from existing tables.
+
+    `create_all` creates new tables but never alters existing ones, so columns
+    added to a model after the database was first created are appended here.
+    """
+    try:
+        inspector = inspect(engine)
+        with engine.begin() as conn:
+            for table in SQLModel.metadata.sorted_tables:
+                if not inspector.has_table(table.name):
+                    continue
+                existing = {c['name'] for c in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing:
+                        continue
+                    col_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}'))
+                    logger.info("Added missing column %s.%s", table.name, column.name)
+    except Exception as e:
+        logger.warning("Unable to add missing columns: %s", e)
+
+
+def _canonicalize_duplicate_pairs(engine) -> None:
+    """Rewrite `duplicate` rows from older databases into canonical pairs.
+
+    Older versions stored pairs in either order and could store a pair twice,
+    which would block the unique pair index. Swaps each pair into
+    `filename_a < filename_b`, keeps the oldest row per pair (flagged as a false
+    positive if any copy was), and drops the old single-column index on
+    `filename_a` that the pair index makes redundant.
+    """
+    try:
+        with engine.begin() as conn:
+            if not inspect(conn).has_table('duplicate'):
+                return
+            conn.execute(text(
+                'UPDATE duplicate SET filename_a = filename_b, filename_b = filename_a '
+                'WHERE filename_a > filename_b'
+            ))
+            conn.execute(text(
+                'UPDATE duplicate SET is_false_positive = 1 WHERE id IN ('
+                'SELECT MIN(id) FROM duplicate GROUP BY filename_a, filename_b '
+                'HAVING COUNT(*) > 1 AND MAX(is_false_positive) = 1)'
+            ))
+            conn.execute(text(
+                'DELETE FROM duplicate WHERE id NOT IN ('
+                'SELECT MIN(id) FROM duplicate GROUP BY filename_a, filename_b)'
+            ))
+            conn.execute(text('DROP INDEX IF EXISTS ix_duplicate_filename_a'))
+    except Exception as e:
+        logger.warning("Unable to canonicalize duplicate pairs: %s", e)
+
+
+def _add_missing_indexes(engine) -> None:
+    """Create model indexes missing from existing tables.
+
+    Like columns, indexes declared after a table was first created are not
+    added by `create_all`.
+    """
+    try:
+        with engine.begin() as conn:
+            for table in SQLModel.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+    except Exception as e:
+        logger.warning("Unable to add missing indexes: %s", e)
+
+
+def _backfill_phash_bits(engine) -> None:
+    """Populate `Meme.phash_bits` for rows that only have the hex phash."""
+    from .deduplication import phash_to_int
+
+    try:
+        with Session(engine) as session:
+            rows = session.exec(select(Meme).where(Meme.phash.isnot(None), Meme.phash_bits.is_(None))).all()
+            for m in rows:
+                m.phash_bits = phash_to_int(m.phash)
+                session.add(m)
+            if rows:
+                session.commit()
+                logger.info("Backfilled phash_bits for %d memes", len(rows))
+    except Exception as e:
+        logger.warning("Unable to backfill phash_bits: %s", e)
+
+
 def get_meme_by_filename(session: Session, filename: str) -> Optional[Meme]:
     """Get a single meme by filename."""
     return session.exec(select(Meme).where(Meme.filename == filename)).first()
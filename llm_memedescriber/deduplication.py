@@ -6,6 +6,8 @@ from io import BytesIO
 from typing import List, Dict, Optional, Set, FrozenSet
 
 import imagehash
+import numpy as np
+import scipy.fft
 from PIL import Image
 from sqlmodel import Session, select
 
@@ -15,27 +17,31 @@ from .storage import WebDavStorage
 
 logger = logging.getLogger(__name__)
 
+# imagehash.phash works on a 32x32 grayscale image (hash_size 8 * highfreq_factor 4)
+_PHASH_HASH_SIZE = 8
+_PHASH_DECODE_SIZE = (32, 32)
+_PHASH_MASK = (1 << 64) - 1
 
-def calculate_phash(data: bytes) -> Optional[str]:
-    """Calculate perceptual hash for image data.
-    
-    Args:
-        data: Image bytes to hash
-        
-    Returns:
-        Hex string of perceptual hash, or None on failure
+
+def _phash_input(data: bytes) -> Optional[Image.Image]:
+    """Decode image bytes into the flattened RGB/L image that pHash is computed from.
+
+    JPEG input is decoded in draft mode (grayscale, DCT-scaled close to the
+    32x32 pHash input) so large photos are never fully decoded. Returns None
+    for empty or undecodable data.
     """
     try:
         if not data:
             logger.warning("Cannot calculate phash: empty data")
             return None
-            
+
         if len(data) < 100:  # Suspiciously small, likely corrupted
             logger.warning("Cannot calculate phash: data too small (%d bytes)", len(data))
             return None
-            
+
         img = Image.open(BytesIO(data))
-        
+        img.draft('L', _PHASH_DECODE_SIZE)  # no-op for non-JPEG formats
+
         if img.mode in ('RGBA', 'LA', 'P'):
             background = Image.new('RGB', img.size, (255, 255, 255))
             if img.mode in ('RGBA', 'LA'):
@@ -43,9 +49,27 @@ def calculate_phash(data: bytes) -> Optional[str]:
             else:
                 background.paste(img)
             img = background
-        elif img.mode != 'RGB':
+        elif img.mode not in ('RGB', 'L'):
             img = img.convert('RGB')
-        
+        return img
+    except Exception as e:
+        logger.debug("Failed to decode image for phash: %s", str(e))
+        return None
+
+
+def calculate_phash(data: bytes) -> Optional[str]:
+    """Calculate perceptual hash for image data.
+
+    Args:
+        data: Image bytes to hash
+
+    Returns:
+        Hex string of perceptual hash, or None on failure
+    """
+    try:
+        img = _phash_input(data)
+        if img is None:
+            return None
         phash = imagehash.phash(img)
         return str(phash)
     except Exception as e:
@@ -53,6 +77,55 @@ def calculate_phash(data: bytes) -> Optional[str]:
         return None
 
 
+def calculate_phash_batch(datas: List[bytes]) -> List[Optional[str]]:
+    """Calculate perceptual hashes for many images with one vectorized DCT.
+
+    Images are decoded and resized individually, then stacked into an
+    (N, 32, 32) array so the DCT, median and bit packing run once in C for
+    the whole batch. Produces the same hex strings as `calculate_phash`;
+    entries that cannot be decoded are None.
+    """
+    results: List[Optional[str]] = [None] * len(datas)
+    pixels = []
+    positions = []
+    for i, data in enumerate(datas):
+        img = _phash_input(data)
+        if img is None:
+            continue
+        try:
+            gray = img.convert('L').resize(_PHASH_DECODE_SIZE, Image.Resampling.LANCZOS)
+            pixels.append(np.asarray(gray, dtype=np.float64))
+            positions.append(i)
+        except Exception as e:
+            logger.debug("Failed to prepare image for batch phash: %s", str(e))
+
+    if not pixels:
+        return results
+
+    stack = np.stack(pixels)
+    dct = scipy.fft.dct(scipy.fft.dct(stack, axis=1), axis=2)
+    low = dct[:, :_PHASH_HASH_SIZE, :_PHASH_HASH_SIZE].reshape(len(positions), -1)
+    bits = low > np.median(low, axis=1, keepdims=True)
+    for i, packed in zip(positions, np.packbits(bits, axis=1)):
+        results[i] = packed.tobytes().hex()
+    return results
+
+
+def phash_to_int(phash: Optional[str]) -> Optional[int]:
+    """Convert a 16-char hex phash to a signed 64-bit int.
+
+    The signed form fits SQLite's INTEGER column; mask with 64 ones before
+    counting bits. Returns None for missing or malformed hashes.
+    """
+    if not isinstance(phash, str) or len(phash) != 16:
+        return None
+    try:
+        val = int(phash, 16)
+    except ValueError:
+        return None
+    return val - (1 << 64) if val >> 63 else val
+
+
 def hamming_distance(hash1: str, hash2: str) -> int:
     """Calculate Hamming distance between two hash strings (hex format)."""
 
@@ -65,24 +138,26 @@ def hamming_distance(hash1: str, hash2: str) -> int:
         return 999
 
     try:
-        int(hash1, 16)
-        int(hash2, 16)
+        return (int(hash1, 16) ^ int(hash2, 16)).bit_count()
     except ValueError:
         return 999
 
-    try:
-        h1 = imagehash.hex_to_hash(hash1)
-        h2 = imagehash.hex_to_hash(hash2)
-        return h1 - h2
-    except Exception as e:
-        logger.debug(f"Failed to calculate hamming distance for {hash1} and {hash2}: {e}")
-        return 999
+
+def hamming_bits(bits1: Optional[int], bits2: Optional[int]) -> Optional[int]:
+    """Hamming distance between two `phash_bits` values (signed 64-bit ints).
+
+    Registered as the SQLite function `hamming` so distances can be computed
+    in queries; returns None (SQL NULL) if either side is NULL.
+    """
+    if bits1 is None or bits2 is None:
+        return None
+    return ((bits1 ^ bits2) & _PHASH_MASK).bit_count()
 
 
 def find_duplicate_groups(session: Session) -> List[List[Meme]]:
     """Find groups of duplicate memes based on perceptual hash."""
     memes = session.exec(
-        select(Meme).where(Meme.phash.isnot(None))
+        select(Meme).where(Meme.phash.isnot(None), Meme.status != 'removed')
     ).all()
     
     # Load pairwise exceptions (duplicates table entries marked as false_positive)
@@ -101,6 +176,8 @@ def find_duplicate_groups(session: Session) -> List[List[Meme]]:
         logger.warning("find_duplicate_groups: No memes with phash found")
         return []
     
+    bits = [m.phash_bits if m.phash_bits is not None else phash_to_int(m.phash) for m in memes]
+
     groups: Dict[int, List[Meme]] = {}
     assigned = set()
     group_counter = 0
@@ -126,7 +203,9 @@ def find_duplicate_groups(session: Session) -> List[List[Meme]]:
                 logger.debug(f"Skipping pair due to user exception: {meme1.filename} <-> {meme2.filename}")
                 continue
 
-            distance = hamming_distance(meme1.phash, meme2.phash)
+            if bits[i] is None or bits[j] is None:
+                continue
+            distance = ((bits[i] ^ bits[j]) & _PHASH_MASK).bit_count()
             if distance <= DUPLICATE_THRESHOLD:
                 logger.debug(f"Found duplicate: {meme1.filename} <-> {meme2.filename} (distance: {distance})")
                 group.append(meme2)
@@ -170,14 +249,9 @@ def mark_false_positive(session: Session, filename: str) -> bool:
 def add_pair_exception(session: Session, filename_a: str, filename_b: str) -> Duplicate:
     """Create or return a Duplicate record marking the pair as false positive."""
     # Normalize order to keep duplicates unique regardless of order
-    a = filename_a
-    b = filename_b
-    # Check existing in either order
+    a, b = sorted((filename_a, filename_b))
     existing = session.exec(
-        select(Duplicate).where(
-            ((Duplicate.filename_a == a) & (Duplicate.filename_b == b)) |
-            ((Duplicate.filename_a == b) & (Duplicate.filename_b == a))
-        )
+        select(Duplicate).where(Duplicate.filename_a == a, Duplicate.filename_b == b)
     ).first()
     if existing:
         if not existing.is_false_positive:
@@ -194,13 +268,9 @@ def add_pair_exception(session: Session, filename_a: str, filename_b: str) -> Du
 
 
 def remove_pair_exception(session: Session, filename_a: str, filename_b: str) -> bool:
-    a = filename_a
-    b = filename_b
+    a, b = sorted((filename_a, filename_b))
     existing = session.exec(
-        select(Duplicate).where(
-            ((Duplicate.filename_a == a) & (Duplicate.filename_b == b)) |
-            ((Duplicate.filename_a == b) & (Duplicate.filename_b == a))
-        )
+        select(Duplicate).where(Duplicate.filename_a == a, Duplicate.filename_b == b)
     ).first()
     if not existing:
         return False
@@ -291,12 +361,16 @@ def merge_duplicates(
             logger.debug("Failed to remove meme-group links for duplicates")
 
         # Delete duplicate Meme records and files
+        try:
+            delete_errors = storage.delete_files([dup.filename for dup in duplicates])
+        except Exception as e:
+            delete_errors = {dup.filename: e for dup in duplicates}
+
         for dup in duplicates:
-            try:
-                storage.delete_file(dup.filename)
+            if dup.filename in delete_errors:
+                logger.warning("Failed to delete %s from storage: %s", dup.filename, delete_errors[dup.filename])
+            else:
                 logger.info("Deleted file %s from storage", dup.filename)
-            except Exception as e:
-                logger.warning("Failed to delete %s from storage: %s", dup.filename, e)
 
             try:
                 session.delete(dup)
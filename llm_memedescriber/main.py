@@ -1,28 +1,44 @@
 import asyncio
 import datetime
+import email.utils
+import functools
+import hashlib
 import json
 import logging
+import queue
+import random
 import re
+import sys
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
-from typing import Any, Dict, List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from typing import Any, Dict, Iterator, List, Optional
 
 from google.genai import types
+from sqlalchemy import case, delete, func, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlmodel import select
 from .db_helpers import session_scope
 
 from .config import parse_interval, load_settings
 from .constants import *
-from .models import Meme, DuplicateGroup as DBDuplicateGroup, MemeDuplicateGroup as DBDupeLink
-from .deduplication import find_duplicate_groups, calculate_phash
+from .models import Meme, PhashCache, DuplicateGroup as DBDuplicateGroup, MemeDuplicateGroup as DBDupeLink
+from .deduplication import find_duplicate_groups, calculate_phash, calculate_phash_batch, phash_to_int
 from .storage import WebDavStorage
 from .storage_workers import StorageWorkerPool
-from .storage_helpers import compute_and_persist_phash
+from .storage_helpers import call_storage, compute_and_persist_phash, lookup_cached_phashes
 from .preview_helpers import cleanup_orphaned_cache
 
 logger = logging.getLogger(__name__)
 
+_STATUS_FILLED = sys.intern('filled')
+_STATUS_PENDING = sys.intern('pending')
+_STATUS_REMOVED = sys.intern('removed')
+
+_JSON_DECODER = json.JSONDecoder()
+_RX_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_RFC1123 = "%a, %d %b %Y %H:%M:%S GMT"
+
 def _load_prompt() -> str:
     try:
         with open('/app/PROMPT.txt', 'r', encoding='utf-8') as f:
@@ -32,6 +48,67 @@ def _load_prompt() -> str:
 
 PROMPT = _load_prompt()
 
+# Request-invariant GenAI inputs, built once instead of on every generate_description call
+_PROMPT_PART = types.Part.from_text(text=PROMPT)
+_SAFETY_SETTINGS = [
+    types.SafetySetting(category=category, threshold=types.HarmBlockThreshold.BLOCK_NONE)
+    for category in (
+        types.HarmCategory.HARM_CATEGORY_HARASSMENT,
+        types.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
+        types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
+        types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
+    )
+]
+_GEN_CONFIG = types.GenerateContentConfig(safety_settings=_SAFETY_SETTINGS)
+
+
+@functools.lru_cache(maxsize=65536)
+def _parse_dt(value: str) -> Optional[datetime.datetime]:
+    """Parse a WebDAV date string; None if unparseable.
+
+    The format is picked from the string's shape so the common case costs a
+    single parse attempt. Listings repeat the same date strings every sync,
+    so results are memoized.
+    """
+    if len(value) > 4 and value[3] == ',':  # RFC 1123: "Sun, 06 Nov 1994 08:49:37 GMT"
+        try:
+            return datetime.datetime.strptime(value, _RFC1123).replace(tzinfo=datetime.timezone.utc)
+        except ValueError:
+            pass
+        try:
+            return email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if len(value) > 4 and value[4] == '-':  # ISO 8601: "1994-11-06T08:49:37Z"
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    try:
+        return email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _chunks(seq: List[Any], size: int = SQL_IN_CHUNK_SIZE) -> Iterator[List[Any]]:
+    """Yield consecutive slices of `seq` with at most `size` items."""
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def _norm_kw(kw: Any) -> Optional[str]:
+    """Normalize model `keywordy` output (list or comma-separated str) to the stored form."""
+    return ','.join(kw) if type(kw) is list else (kw if type(kw) is str else None)
+
+
+def _coerce_dt(value) -> Optional[datetime.datetime]:
+    """Return a datetime for a WebDAV date property value (datetime or string)."""
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value
+    return _parse_dt(str(value))
+
 
 def main():
     settings = load_settings()
@@ -46,11 +123,11 @@ def main():
     from .db import init_db
     
     base_url = settings.webdav_url.rstrip('/')
-    base_storage = WebDavStorage(base_url, auth=(settings.webdav_username, settings.webdav_password))
     try:
         storage_workers = int(getattr(settings, 'storage_workers', DEFAULT_STORAGE_WORKERS) or DEFAULT_STORAGE_WORKERS)
     except Exception:
         storage_workers = DEFAULT_STORAGE_WORKERS
+    base_storage = WebDavStorage(base_url, auth=(settings.webdav_username, settings.webdav_password), max_connections=storage_workers)
     try:
         storage_concurrency = int(getattr(settings, 'storage_concurrency', DEFAULT_STORAGE_CONCURRENCY) or DEFAULT_STORAGE_CONCURRENCY)
     except Exception:
@@ -85,11 +162,21 @@ class App:
         self.interval_seconds = interval_seconds
         self.stop_event = threading.Event()
         self.worker_thread: Optional[threading.Thread] = None
-        self.needs_description: List[str] = []
+        self.needs_description: set[str] = set()
         self._needs_description_lock = threading.Lock()
         self._shutdown_done: bool = False
         self._sync_lock = threading.Lock()
         self._sync_in_progress: bool = False
+        self._gen_pool = ThreadPoolExecutor(max_workers=BATCH_PROCESS_WORKERS, thread_name_prefix="gen")
+        # One loop reused by every sync cycle; run_in_executor work lands on the shared pool
+        self._phash_loop = asyncio.new_event_loop()
+        self._phash_loop.set_default_executor(self._gen_pool)
+        self._listing_sizes: Dict[str, int] = {}
+        self._last_dupe_count: Optional[int] = None
+        self._dupe_signature: Optional[tuple] = None
+        self._save_queue: queue.Queue = queue.Queue()
+        self._db_writer_thread: Optional[threading.Thread] = None
+        self._db_writer_lock = threading.Lock()
 
     def start(self):
         """Start the worker thread (non-blocking)."""
@@ -120,6 +207,11 @@ class App:
             self.worker_thread.join(timeout=10)
             if self.worker_thread.is_alive():
                 logger.warning("Worker thread did not exit within timeout; it may still be processing ongoing operations")
+        self._gen_pool.shutdown(wait=False, cancel_futures=True)
+        try:
+            self._phash_loop.close()
+        except RuntimeError:
+            logger.warning("phash event loop still running; not closed")
 
     def _worker(self):
         logger.info("Worker started")
@@ -155,7 +247,8 @@ class App:
                 exc_str = str(exc).lower()
                 if 'locked' in exc_str or 'database is locked' in exc_str:
                     if attempt < max_retries - 1:
-                        backoff = initial_backoff * (2 ** attempt)
+                        # Jittered so writers that hit the same lock do not retry in lock-step
+                        backoff = initial_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
                         logger.debug("DB locked on attempt %d; retrying after %.2fs", attempt + 1, backoff)
                         time.sleep(backoff)
                         continue
@@ -166,6 +259,72 @@ class App:
         logger.exception("DB operation failed after %d attempts: %s", max_retries, last_exc)
         return False
 
+    def _save_description(self, name: str, desc: Dict[str, Any]) -> bool:
+        """Hand a generated description to the DB writer thread and wait for its commit."""
+        fut: Future = Future()
+        self._ensure_db_writer()
+        self._save_queue.put((name, desc, fut))
+        try:
+            return fut.result(timeout=DB_SAVE_TIMEOUT_SECONDS)
+        except TimeoutError:
+            logger.warning("Timed out waiting for DB writer to save description for %s", name)
+            return False
+
+    def _ensure_db_writer(self) -> None:
+        with self._db_writer_lock:
+            if self._db_writer_thread and self._db_writer_thread.is_alive():
+                return
+            self._db_writer_thread = threading.Thread(target=self._db_writer, daemon=True, name="DBWriter")
+            self._db_writer_thread.start()
+
+    def _db_writer(self) -> None:
+        """Single writer: drain queued saves and commit them in batches.
+
+        Generation threads only enqueue, so SQLite sees one writer instead of
+        several threads contending for the write lock.
+        """
+        while True:
+            try:
+                batch = [self._save_queue.get(timeout=0.25)]
+            except queue.Empty:
+                if self.stop_event.is_set():
+                    self._fail_queued_saves()
+                    return
+                continue
+            while len(batch) < DB_WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._save_queue.get_nowait())
+                except queue.Empty:
+                    break
+            ok = self._db_operation_with_retry(lambda: self._write_descriptions(batch))
+            for _, _, fut in batch:
+                fut.set_result(ok)
+
+    def _fail_queued_saves(self) -> None:
+        """Resolve saves still queued when the writer exits so their callers don't block."""
+        while True:
+            try:
+                _, _, fut = self._save_queue.get_nowait()
+            except queue.Empty:
+                return
+            fut.set_result(False)
+
+    def _write_descriptions(self, batch: List[Tuple[str, Dict[str, Any], Future]]) -> None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with session_scope(self.engine) as session:
+            for name, desc, _ in batch:
+                values: Dict[str, Any] = {'status': _STATUS_FILLED, 'updated_at': now}
+                for column, key in (('category', 'kategoria'), ('description', 'opis'), ('text_in_image', 'tekst')):
+                    if desc.get(key):
+                        values[column] = desc[key]
+                kw = _norm_kw(desc.get('keywordy'))
+                if kw is not None:
+                    values['keywords'] = kw
+                result = session.exec(update(Meme).where(Meme.filename == name).values(**values))
+                if not result.rowcount:
+                    session.add(Meme(filename=name, **values))
+            session.commit()
+
     def _process_single_meme(self, name: str) -> Dict[str, Any]:
         """Process a single meme: generate description and save to DB only.
         Returns dict with 'saved', 'unsupported', 'rate_limited', or 'failed' keys, and 'desc' with description.
@@ -182,31 +341,12 @@ class App:
                 return {'rate_limited': True}
             
             if desc:
-                
-                def save_to_db():
-                    with session_scope(self.engine) as session:
-                        m = session.exec(select(Meme).where(Meme.filename == name)).first()
-                        if not m:
-                            m = Meme(filename=name)
-                        m.category = desc.get('kategoria') or m.category
-                        m.description = desc.get('opis') or m.description
-                        kw = desc.get('keywordy')
-                        if isinstance(kw, list):
-                            m.keywords = ','.join(kw)
-                        elif isinstance(kw, str):
-                            m.keywords = kw
-                        m.text_in_image = desc.get('tekst') or m.text_in_image
-                        m.status = 'filled'
-                        m.updated_at = datetime.datetime.now(datetime.timezone.utc)
-                        session.add(m)
-                        session.commit()
-                
-                if not self._db_operation_with_retry(save_to_db, max_retries=3):
+                if not self._save_description(name, desc):
                     logger.error("Failed to save description to DB for %s after retries", name)
                     return {'failed': True}
                 
                 with self._needs_description_lock:
-                    self.needs_description = [k for k in self.needs_description if k != name]
+                    self.needs_description.discard(name)
                 logger.debug("Successfully processed %s", name)
                 return {'saved': True, 'desc': desc, 'name': name}
             else:
@@ -215,6 +355,26 @@ class App:
             logger.exception("Failed to process meme %s: %s", name, exc)
             return {'failed': True}
 
+    def _update_meme_attempts(self, filename: str, *, last_error: Optional[str] = None, status: Optional[str] = None) -> None:
+        """Record a generation attempt for `filename` with a single UPDATE.
+
+        `attempts` is incremented server-side, so concurrent attempts can't lose counts.
+        Errors are swallowed: attempt bookkeeping must never fail a generation.
+        """
+        values: Dict[str, Any] = {
+            'attempts': func.coalesce(Meme.attempts, 0) + 1,
+            'last_attempt_at': datetime.datetime.now(datetime.timezone.utc),
+            'last_error': last_error,
+        }
+        if status:
+            values['status'] = status
+        try:
+            with session_scope(self.engine) as session:
+                session.exec(update(Meme).where(Meme.filename == filename).values(**values))
+                session.commit()
+        except Exception:
+            pass
+
     def generate_description(self, filename: str) -> Dict[str, Any]:
         """Generate a description for `filename` using the instance genai client and webdav client.
         
@@ -222,23 +382,18 @@ class App:
         Updates DB with error info and increments attempts counter.
         """
         error_info = ""
+        size = self._listing_sizes.get(filename)
+        max_bytes = getattr(self.settings, 'max_upload_bytes', DEFAULT_MAX_UPLOAD_BYTES)
+        if size and max_bytes and size > max_bytes:
+            self._update_meme_attempts(filename, last_error=f"File too large: {size} bytes", status='oversize')
+            logger.info("Marked %s as oversize (%d bytes); will not retry", filename, size)
+            return {}
         try:
-            file_bytes = self.storage.download_file(filename)
+            file_bytes = self.storage.download_file(filename, size_hint=size)
         except Exception as exc:
             error_info = str(exc)
             logger.error("Error reading file %s from WebDAV: %s", filename, exc)
-            
-            try:
-                with session_scope(self.engine) as session:
-                    m = session.exec(select(Meme).where(Meme.filename == filename)).first()
-                    if m:
-                        m.attempts = (m.attempts or 0) + 1
-                        m.last_attempt_at = datetime.datetime.now(datetime.timezone.utc)
-                        m.last_error = error_info
-                        session.add(m)
-                        session.commit()
-            except Exception:
-                pass
+            self._update_meme_attempts(filename, last_error=error_info)
             return {}
 
         mime_type, media_res = self._detect_media(filename)
@@ -250,27 +405,8 @@ class App:
             part = types.Part.from_bytes(data=file_bytes, mime_type=mime_type, media_resolution=media_res)
             response = self.genai_client.models.generate_content(
                 model=self.settings.google_genai_model,
-                contents=[part, PROMPT],
-                config=types.GenerateContentConfig(
-                    safety_settings=[
-                        types.SafetySetting(
-                            category=types.HarmCategory.HARM_CATEGORY_HARASSMENT,
-                            threshold=types.HarmBlockThreshold.BLOCK_NONE,
-                        ),
-                        types.SafetySetting(
-                            category=types.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-                            threshold=types.HarmBlockThreshold.BLOCK_NONE,
-                        ),
-                        types.SafetySetting(
-                            category=types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
-                            threshold=types.HarmBlockThreshold.BLOCK_NONE,
-                        ),
-                        types.SafetySetting(
-                            category=types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-                            threshold=types.HarmBlockThreshold.BLOCK_NONE,
-                        ),
-                    ]
-                )
+                contents=[part, _PROMPT_PART],
+                config=_GEN_CONFIG,
             )
             
         except Exception as exc:
@@ -280,63 +416,103 @@ class App:
             is_unsupported = 'Unsupported MIME type' in error_info
             is_rate_limited = '429' in error_info or 'rate limit' in error_info.lower()
             
-            try:
-                with session_scope(self.engine) as session:
-                    m = session.exec(select(Meme).where(Meme.filename == filename)).first()
-                    if m:
-                        m.attempts = (m.attempts or 0) + 1
-                        m.last_attempt_at = datetime.datetime.now(datetime.timezone.utc)
-                        m.last_error = error_info
-                        if is_unsupported:
-                            m.status = 'unsupported'
-                            logger.info("Marked %s as unsupported MIME type; will not retry", filename)
-                        session.add(m)
-                        session.commit()
-            except Exception:
-                pass
+            self._update_meme_attempts(filename, last_error=error_info, status='unsupported' if is_unsupported else None)
+            if is_unsupported:
+                logger.info("Marked %s as unsupported MIME type; will not retry", filename)
             
             if is_rate_limited:
                 return {'rate_limited': True, 'error': 'Rate limit exceeded'}
             return {}
 
         
-        for txt in self._text_candidates_from_response(response):
+        for txt in self._iter_text_candidates(response):
             if not txt:
                 continue
             parsed = self._extract_json_from_text(txt)
             if parsed is not None:
                 logger.debug("Generated JSON for %s", filename)
-                
-                try:
-                    with session_scope(self.engine) as session:
-                        m = session.exec(select(Meme).where(Meme.filename == filename)).first()
-                        if m:
-                            m.attempts = (m.attempts or 0) + 1
-                            m.last_attempt_at = datetime.datetime.now(datetime.timezone.utc)
-                            m.last_error = None
-                            session.add(m)
-                            session.commit()
-                except Exception:
-                    pass
+                self._update_meme_attempts(filename, last_error=None)
                 return parsed
 
         logger.warning("Failed to extract JSON description for %s", filename)
-        
-        try:
-            with session_scope(self.engine) as session:
-                m = session.exec(select(Meme).where(Meme.filename == filename)).first()
-                if m:
-                    m.attempts = (m.attempts or 0) + 1
-                    m.last_attempt_at = datetime.datetime.now(datetime.timezone.utc)
-                    m.last_error = "no_json_extracted"
-                    session.add(m)
-                    session.commit()
-        except Exception:
-            pass
+        self._update_meme_attempts(filename, last_error="no_json_extracted")
         return {}
     
 
 
+    def _run_async(self, coro: Any) -> Any:
+        """Run `coro` to completion on the App's persistent event loop.
+
+        When called from inside a running loop (the FastAPI startup sync), the
+        coroutine runs on a pool thread instead, since a loop can't be nested.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return self._phash_loop.run_until_complete(coro)
+        return self._gen_pool.submit(asyncio.run, coro).result()
+
+    async def _download_many(self, names: List[str]) -> Dict[str, bytes]:
+        """Download files concurrently, bounded by the storage concurrency setting.
+
+        Failed downloads are logged and left out of the returned mapping.
+        """
+        try:
+            limit = int(getattr(self.settings, 'storage_concurrency', DEFAULT_STORAGE_CONCURRENCY) or DEFAULT_STORAGE_CONCURRENCY)
+        except Exception:
+            limit = DEFAULT_STORAGE_CONCURRENCY
+        sem = asyncio.Semaphore(limit)
+
+        async def fetch(name: str) -> Optional[bytes]:
+            async with sem:
+                try:
+                    return await call_storage(self.storage, 'download_file', name)
+                except Exception as exc:
+                    logger.debug("Download failed for %s: %s", name, exc)
+                    return None
+
+        results = await asyncio.gather(*(fetch(n) for n in names))
+        return {n: data for n, data in zip(names, results) if data}
+
+    def _compute_new_phashes(self, names: List[str]) -> int:
+        """Compute and persist phashes for newly listed images that don't have one yet.
+
+        Images are handled PHASH_DOWNLOAD_CHUNK_SIZE at a time (download, hash, persist)
+        so only one chunk of file contents is held in memory. Content already in the
+        phash cache (matched by SHA-1) is not rehashed. Returns the number of memes updated.
+        """
+        pending = []
+        with session_scope(self.engine) as session:
+            for chunk in _chunks(names):
+                pending.extend(session.exec(select(Meme.filename).where(Meme.filename.in_(chunk), Meme.phash == None)).all())
+        pending = [n for n in pending if is_image(n)]
+        if not pending:
+            return 0
+
+        updated = 0
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for chunk in _chunks(pending, PHASH_DOWNLOAD_CHUNK_SIZE):
+            downloaded = self._run_async(self._download_many(chunk))
+            digests = {}
+            for name, data in downloaded.items():
+                digests[name] = hashlib.sha1(data).hexdigest()
+            cached = lookup_cached_phashes(self.engine, list(set(digests.values())))
+            misses = [n for n in downloaded if digests[n] not in cached]
+            computed = dict(zip(misses, calculate_phash_batch([downloaded[n] for n in misses])))
+            del downloaded
+
+            with session_scope(self.engine) as session:
+                for name, digest in digests.items():
+                    phash = cached.get(digest) or computed.get(name)
+                    if not phash:
+                        continue
+                    session.exec(update(Meme).where(Meme.filename == name).values(phash=phash, phash_bits=phash_to_int(phash), updated_at=now))
+                    if name in computed:
+                        session.exec(sqlite_insert(PhashCache).values(sha1=digest, phash=phash).on_conflict_do_nothing())
+                    updated += 1
+                session.commit()
+        return updated
+
     def sync_and_process(self) -> Dict[str, int]:
         """Run a single sync and generate descriptions for unfilled files using instance clients."""
         
@@ -355,17 +531,34 @@ class App:
     def _sync_and_process_impl(self) -> Dict[str, int]:
         """Implementation of sync and process (called with lock held)."""
         
-        existing = {}  # Start with empty dict, only use DB from now on
+        existing = {}
+        try:
+            with session_scope(self.engine) as session:
+                # Only the filename column is needed; skip loading descriptions for every meme
+                filenames = session.exec(select(Meme.filename).where(Meme.status != _STATUS_REMOVED)).all()
+            existing = {fn: {} for fn in filenames}
+        except Exception:
+            logger.exception("Failed to load known memes from DB; treating all listed files as new")
 
         entries = self.storage.list_files('/', recursive=False)
+        self._listing_sizes = {e['name']: e['size'] for e in entries if not e.get('is_dir') and e.get('size')}
         server_names = {e['name'] for e in entries if not e['is_dir'] and is_supported(e['name'])}
         server_names_to_process = server_names
 
-        existing_basename_map = {k: str(k).rstrip('/').split('/')[-1] for k in existing.keys()}
-        existing_basenames = set(existing_basename_map.values())
+        existing_set = set(existing)
+        if any('/' in k for k in existing_set):
+            # Legacy path-style keys: compare by basename
+            existing_basename_map = {k: str(k).rstrip('/').split('/')[-1] for k in existing_set}
+            to_add = sorted(server_names - set(existing_basename_map.values()))
+            to_remove = [k for k, base in existing_basename_map.items() if base not in server_names]
+        else:
+            to_add = sorted(server_names - existing_set)
+            to_remove = list(existing_set - server_names)
 
-        to_add = sorted(list(server_names - existing_basenames))
-        to_remove = [k for k, base in existing_basename_map.items() if base not in server_names]
+        if not server_names and to_remove:
+            # An empty listing is far more likely a WebDAV hiccup than a wiped library
+            logger.warning("Listing returned no files; not marking %d known memes as removed", len(to_remove))
+            to_remove = []
 
         changed = False
         for k in to_remove:
@@ -383,24 +576,32 @@ class App:
                      len(server_names), len(existing), len(to_add), len(to_remove), changed, getattr(self.settings, 'sync_max_records', None))
 
         unfilled = []
+        unsupported_set = set()
         try:
             with session_scope(self.engine) as session:
                 filenames_to_check = [k for k, v in existing.items() if not v]
                 if filenames_to_check:
-                    memes = session.exec(select(Meme).where(Meme.filename.in_(filenames_to_check))).all()
-                    meme_map = {m.filename: m for m in memes}
+                    status_map = {}
+                    for chunk in _chunks(filenames_to_check):
+                        rows = session.exec(select(Meme.filename, Meme.status, Meme.description != None).where(Meme.filename.in_(chunk))).all()
+                        for fn, status, described in rows:
+                            if status == _STATUS_REMOVED:
+                                # Re-listed file: judge it by the status it is restored to below
+                                status = _STATUS_FILLED if described else _STATUS_PENDING
+                            status_map[fn] = status
                     for k in filenames_to_check:
-                        m = meme_map.get(k)
-                        if not m or m.status != 'filled':
+                        status = status_map.get(k)
+                        if status != _STATUS_FILLED:
                             unfilled.append(k)
-                else:
-                    unfilled = []
+                            if status in ('unsupported', 'oversize'):
+                                unsupported_set.add(k)
         except Exception:
             logger.exception("Failed to check DB status for unfilled detection")
             unfilled = []
+            unsupported_set = set()
 
         with self._needs_description_lock:
-            self.needs_description = unfilled
+            self.needs_description = set(unfilled)
 
         
         max_records = getattr(self.settings, 'sync_max_records', DEFAULT_SYNC_MAX_RECORDS)
@@ -421,43 +622,46 @@ class App:
         try:
             entry_map = {e['name']: e for e in entries if not e.get('is_dir')}
             with session_scope(self.engine) as session:
-                names_to_check = list(server_names.union(set(to_remove)))
-                existing_map = {}
-                if names_to_check:
-                    existing_mems = session.exec(select(Meme).where(Meme.filename.in_(names_to_check))).all()
-                    existing_map = {m.filename: m for m in existing_mems}
-
-                for name in server_names_to_process:
-                    if name not in existing_map:
-                        source_url = self.settings.webdav_url.rstrip('/') + '/' + self.settings.webdav_path.lstrip('/') + '/' + name
-                        status = 'filled' if existing.get(name) else 'pending'
-                        m = Meme(filename=name, source_url=source_url, status=status)
-                        try:
-                            entry = entry_map.get(name)
-                            if entry:
-                                date_str = entry.get('getlastmodified') or entry.get('modified') or entry.get('creationdate') or entry.get('getcreationdate')
-                                if date_str:
-                                    if isinstance(date_str, datetime.datetime):
-                                        m.created_at = date_str
-                                    else:
-                                        try:
-                                            import email.utils as _eu
-                                            dt = _eu.parsedate_to_datetime(date_str)
-                                            m.created_at = dt
-                                        except Exception:
-                                            try:
-                                                m.created_at = datetime.datetime.fromisoformat(date_str)
-                                            except Exception:
-                                                pass
-                        except Exception:
-                            pass
-                        session.add(m)
-                
-                for name in to_remove:
-                    existing_m = existing_map.get(name)
-                    if existing_m:
-                        existing_m.status = 'removed'
-                        session.add(existing_m)
+                # Files missing from the DB get a row. Memes previously marked removed that are
+                # listed again are restored: 'filled' if they kept a description, else 'pending'.
+                now = datetime.datetime.now(datetime.timezone.utc)
+                url_prefix = self.settings.webdav_url.rstrip('/') + '/' + self.settings.webdav_path.lstrip('/') + '/'
+                rows = []
+                # Hot lookups bound to locals: this loop runs once per new file
+                append_row = rows.append
+                entry_get = entry_map.get
+                coerce_dt = _coerce_dt
+                for name in (n for n in to_add if n in server_names_to_process):
+                    created_at = now
+                    entry = entry_get(name)
+                    if entry:
+                        date_val = entry.get('getlastmodified') or entry.get('modified') or entry.get('creationdate') or entry.get('getcreationdate')
+                        created_at = coerce_dt(date_val) or created_at
+                    append_row({
+                        'filename': name,
+                        'source_url': url_prefix + name,
+                        'status': _STATUS_PENDING,
+                        'attempts': 0,
+                        'is_false_positive': False,
+                        'created_at': created_at,
+                        'updated_at': now,
+                    })
+
+                # Every row binds one parameter per column
+                batch_size = max(1, (SQLITE_MAX_VARIABLES - LISTING_UPSERT_EXTRA_PARAMS) // len(rows[0])) if rows else 1
+                for i in range(0, len(rows), batch_size):
+                    stmt = sqlite_insert(Meme).values(rows[i:i + batch_size])
+                    session.exec(stmt.on_conflict_do_update(
+                        index_elements=['filename'],
+                        set_={
+                            'status': case((Meme.description != None, _STATUS_FILLED), else_=_STATUS_PENDING),
+                            'updated_at': now,
+                        },
+                        where=Meme.status == _STATUS_REMOVED,
+                    ))
+
+                for chunk in _chunks(to_remove):
+                    session.exec(update(Meme).where(Meme.filename.in_(chunk)).values(status=_STATUS_REMOVED, updated_at=now))
                 session.commit()
         except Exception:
             logger.exception("Failed to persist listing changes to DB")
@@ -468,97 +672,116 @@ class App:
         rate_limited = False
         processed_descriptions = {}
 
-        batch_size = BATCH_PROCESS_WORKERS
-        with ThreadPoolExecutor(max_workers=batch_size) as executor:
-            futures = {}
+        executor = self._gen_pool
+        futures = {}
+
+        for name in unfilled:
+            if self.stop_event.is_set():
+                logger.info("Stop requested; aborting generation loop")
+                break
+            if name in unsupported_set:
+                logger.debug("Skipping %s: marked as unsupported or oversize", name)
+                unsupported_count += 1
+                continue
             
+            if self.stop_event.is_set():
+                logger.info("Stop requested before generating %s; skipping", name)
+                break
             
-            unsupported_set = set()
+            future = executor.submit(self._process_single_meme, name)
+            futures[future] = name
+        
+        for future in as_completed(futures):
+            name = futures[future]
             try:
-                with session_scope(self.engine) as session:
-                    if unfilled:
-                        rows = session.exec(select(Meme).where((Meme.filename.in_(unfilled)) & (Meme.status == 'unsupported'))).all()
-                        unsupported_set = {r.filename for r in rows}
-            except Exception:
-                unsupported_set = set()
-
-            for name in unfilled:
-                if self.stop_event.is_set():
-                    logger.info("Stop requested; aborting generation loop")
+                result = future.result()
+                if result.get('rate_limited'):
+                    logger.warning("Rate limit exceeded; pausing batch processing. Will retry on next sync cycle.")
+                    rate_limited = True
+                    failed_count += 1
+                    # Drop queued work now instead of letting it hit the rate limit too
+                    for pending in futures:
+                        pending.cancel()
                     break
-                if name in unsupported_set:
-                    logger.debug("Skipping %s: marked as unsupported MIME type", name)
+                elif result.get('saved'):
+                    saved_count += 1
+                    if result.get('desc') and result.get('name'):
+                        processed_descriptions[result['name']] = result['desc']
+                elif result.get('unsupported'):
                     unsupported_count += 1
-                    continue
-                
-                if self.stop_event.is_set():
-                    logger.info("Stop requested before generating %s; skipping", name)
-                    break
-                
-                future = executor.submit(self._process_single_meme, name)
-                futures[future] = name
-            
-            for future in futures:
-                name = futures[future]
-                try:
-                    result = future.result()
-                    if result.get('rate_limited'):
-                        logger.warning("Rate limit exceeded; pausing batch processing. Will retry on next sync cycle.")
-                        rate_limited = True
-                        failed_count += 1
-                        break
-                    elif result.get('saved'):
-                        saved_count += 1
-                        if result.get('desc') and result.get('name'):
-                            processed_descriptions[result['name']] = result['desc']
-                    elif result.get('unsupported'):
-                        unsupported_count += 1
-                    else:
-                        failed_count += 1
-                except Exception as exc:
-                    logger.exception("Exception in batch processing for %s: %s", name, exc)
+                else:
                     failed_count += 1
+            except Exception as exc:
+                logger.exception("Exception in batch processing for %s: %s", name, exc)
+                failed_count += 1
+        # The pool outlives this cycle; let in-flight generations land before deduplication runs
+        wait(futures)
 
+        new_phashes = 0
         if to_add:
             logger.info("Scheduling phash calculation for %d newly added memes", len(to_add))
-
-        try:
-            with session_scope(self.engine) as session:
+            try:
+                new_phashes = self._compute_new_phashes(to_add)
+                logger.info("Computed phash for %d newly added memes", new_phashes)
+            except Exception:
+                logger.exception("Failed to compute phash for newly added memes")
+
+        # Dedup and the cache-cleanup filename read share one session; each step fails independently
+        valid_filenames = None
+        with session_scope(self.engine) as session:
+            # Groups only change when phashes or the set of memes change. Every writer of either
+            # bumps updated_at (including phashes computed outside this loop), so this cheap
+            # signature catches removals, restores and new hashes; the first cycle always rebuilds.
+            try:
+                signature = tuple(session.exec(select(
+                    func.count(Meme.id).filter(Meme.phash != None, Meme.status != _STATUS_REMOVED),
+                    func.max(Meme.updated_at),
+                )).one())
+            except Exception:
+                logger.exception("Failed to read duplicate-group signature")
+                signature = None
+            if signature is None or signature != self._dupe_signature:
                 try:
-                    old_links = session.exec(select(DBDupeLink)).all()
-                    for l in old_links:
-                        session.delete(l)
-                    old_groups = session.exec(select(DBDuplicateGroup)).all()
-                    for g in old_groups:
-                        session.delete(g)
+                    try:
+                        session.exec(delete(DBDupeLink))
+                        session.exec(delete(DBDuplicateGroup))
+                        session.commit()
+                    except Exception:
+                        session.rollback()
+                        logger.debug("No previous duplicate groups to clear or failed to clear (during sync)")
+
+                    duplicate_groups = [g for g in find_duplicate_groups(session) if g]
+                    # One flush assigns every group id, so links and groups land in a single commit
+                    dgs = [DBDuplicateGroup() for _ in duplicate_groups]
+                    session.add_all(dgs)
+                    session.flush()
+                    session.add_all([
+                        DBDupeLink(group_id=dg.id, filename=meme.filename)
+                        for dg, group in zip(dgs, duplicate_groups)
+                        for meme in group
+                    ])
                     session.commit()
+                    self._last_dupe_count = len(duplicate_groups)
+                    self._dupe_signature = signature
+                    logger.debug("Deduplication analysis completed after sync: %d groups persisted", len(duplicate_groups))
                 except Exception:
-                    logger.debug("No previous duplicate groups to clear or failed to clear (during sync)")
-
-                duplicate_groups = find_duplicate_groups(session)
-                for group in duplicate_groups:
-                    if not group:
-                        continue
-                    dg = DBDuplicateGroup()
-                    session.add(dg)
-                    session.commit()
-                    session.refresh(dg)
-                    for meme in group:
-                        link = DBDupeLink(group_id=dg.id, filename=meme.filename)
-                        session.add(link)
-                session.commit()
-            logger.debug("Deduplication analysis completed after sync: %d groups persisted", len(duplicate_groups))
-        except Exception:
-            logger.exception("Failed to run deduplication analysis after sync_and_process")
+                    session.rollback()
+                    logger.exception("Failed to run deduplication analysis after sync_and_process")
+            else:
+                logger.debug("No meme or phash changes; keeping %d existing duplicate groups", self._last_dupe_count)
 
-        try:
-            with session_scope(self.engine) as session:
+            try:
                 valid_filenames = set(session.exec(select(Meme.filename)).all())
+            except Exception:
+                logger.exception("Failed to load filenames for orphaned cache cleanup")
+
+        if valid_filenames is not None:
+            try:
                 removed_count = cleanup_orphaned_cache(valid_filenames)
                 if removed_count > 0:
                     logger.info("Cleaned up %d orphaned cache files after sync", removed_count)
-        except Exception:
-            logger.exception("Failed to cleanup orphaned cache after sync_and_process")
+            except Exception:
+                logger.exception("Failed to cleanup orphaned cache after sync_and_process")
 
         result = {
             'added': len(to_add),
@@ -588,63 +811,95 @@ class App:
             return mime_type, types.MediaResolution.MEDIA_RESOLUTION_MEDIUM
         return "application/octet-stream", types.MediaResolution.MEDIA_RESOLUTION_HIGH
 
+    @staticmethod
+    def _balanced_json_object(text: str, start: int) -> Optional[str]:
+        """Return the `{...}` object opening at `text[start]`, honouring nesting and string literals."""
+        depth = 0
+        in_str = False
+        escape = False
+        for i in range(start, len(text)):
+            ch = text[i]
+            if in_str:
+                if escape:
+                    escape = False
+                elif ch == '\\':
+                    escape = True
+                elif ch == '"':
+                    in_str = False
+            elif ch == '"':
+                in_str = True
+            elif ch == '{':
+                depth += 1
+            elif ch == '}':
+                depth -= 1
+                if depth == 0:
+                    return text[start:i + 1]
+        return None
+
     @staticmethod
     def _extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
-        m = re.search(r"```json\s*(\{.*?\})\s*```", text, flags=re.DOTALL | re.IGNORECASE)
-        if not m:
-            m = re.search(r"```\s*(\{.*?\})\s*```", text, flags=re.DOTALL)
-        if not m:
-            m = re.search(r"(\{.*\})", text, flags=re.DOTALL)
-        if not m:
+        # Prefer the object inside a ``` fence, otherwise the first object in the text
+        fence = text.find('```')
+        start = text.find('{', fence) if fence >= 0 else -1
+        if start < 0:
+            start = text.find('{')
+        if start < 0:
             return None
-        candidate = m.group(1)
         try:
-            return json.loads(candidate)
-        except Exception:
-            try:
-                cleaned = re.sub(r",\s*([}\]])", r"\1", candidate)
-                return json.loads(cleaned)
-            except Exception:
+            # Well-formed output decodes in place, ignoring whatever trails the object
+            return _JSON_DECODER.raw_decode(text, start)[0]
+        except ValueError:
+            pass
+        candidate = App._balanced_json_object(text, start)
+        if candidate is None:
+            end = text.rfind('}')
+            if end < start:
                 return None
+            candidate = text[start:end + 1]
+        # raw_decode already rejected the object as-is, so only the trailing-comma repair is worth trying
+        try:
+            return json.loads(_RX_TRAILING_COMMA.sub(r"\1", candidate))
+        except ValueError:
+            return None
 
     @staticmethod
-    def _text_candidates_from_response(response: Any) -> List[str]:
-        texts: List[str] = []
+    def _iter_text_candidates(response: Any) -> Iterator[str]:
+        """Yield candidate texts from a GenAI response, cheapest sources first.
+
+        Callers stop at the first candidate that parses, so the expensive
+        `str(response)` fallback only runs when nothing else worked.
+        """
+        def texts_from(content: Any) -> Iterator[str]:
+            for c in content:
+                if isinstance(c, str):
+                    yield c
+                elif isinstance(c, dict):
+                    if c.get("text"):
+                        yield c.get("text")
+                elif hasattr(c, "text"):
+                    yield getattr(c, "text")
+
         try:
-            if hasattr(response, "outputs") and response.outputs:
-                for out in response.outputs:
-                    if hasattr(out, "content") and out.content:
-                        for c in out.content:
-                            if isinstance(c, str):
-                                texts.append(c)
-                            elif isinstance(c, dict) and c.get("text"):
-                                texts.append(c.get("text"))
-                            elif hasattr(c, "text"):
-                                texts.append(getattr(c, "text"))
-            if hasattr(response, "output") and response.output:
-                for out in response.output:
-                    if hasattr(out, "content") and out.content:
-                        for c in out.content:
-                            if isinstance(c, str):
-                                texts.append(c)
-                            elif isinstance(c, dict) and c.get("text"):
-                                texts.append(c.get("text"))
-                            elif hasattr(c, "text"):
-                                texts.append(getattr(c, "text"))
-            if hasattr(response, "content") and response.content:
-                if isinstance(response.content, str):
-                    texts.append(response.content)
-                elif isinstance(response.content, list):
-                    for c in response.content:
-                        if isinstance(c, str):
-                            texts.append(c)
-                        elif isinstance(c, dict) and c.get("text"):
-                            texts.append(c.get("text"))
+            for attr in ("outputs", "output"):
+                outs = getattr(response, attr, None)
+                if outs:
+                    for out in outs:
+                        content = getattr(out, "content", None)
+                        if content:
+                            yield from texts_from(content)
+            content = getattr(response, "content", None)
+            if content:
+                if isinstance(content, str):
+                    yield content
+                elif isinstance(content, list):
+                    yield from texts_from(content)
+        except Exception:
+            pass
+        # Last resort: str() may serialize the whole SDK response tree, and some objects raise in __str__
+        try:
+            yield str(response)
         except Exception:
             pass
-        texts.append(str(response))
-        return texts
-
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,19 @@
 import datetime
 from typing import Optional
 
+from sqlalchemy import BigInteger, Column, Index
 from sqlmodel import Field, SQLModel
 
+
+def _utcnow(_now=datetime.datetime.now, _utc=datetime.timezone.utc) -> datetime.datetime:
+    """Timestamp default; `now` and `utc` are bound once instead of looked up per row."""
+    return _now(_utc)
+
+
 class Meme(SQLModel, table=True):
+    # Covers status-filtered scans that also need the id (stats, pending lists, reindex)
+    __table_args__ = (Index('ix_meme_status_id', 'status', 'id'),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     filename: str = Field(index=True, unique=True)
     category: Optional[str] = None
@@ -15,10 +25,11 @@ class Meme(SQLModel, table=True):
     attempts: int = Field(default=0)
     last_error: Optional[str] = None
     last_attempt_at: Optional[datetime.datetime] = None
-    created_at: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
-    updated_at: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
+    created_at: datetime.datetime = Field(default_factory=_utcnow)
+    updated_at: datetime.datetime = Field(default_factory=_utcnow)
     
     phash: Optional[str] = Field(default=None, index=True)  # perceptual hash
+    phash_bits: Optional[int] = Field(default=None, sa_column=Column(BigInteger))  # phash as signed 64-bit int
     
     is_false_positive: bool = Field(default=False)  # user marked as "not a duplicate"
 
@@ -28,18 +39,26 @@ class Duplicate(SQLModel, table=True):
 
     `is_false_positive` marks that this specific duplicate link
     should be ignored when forming duplicate groups.
+
+    Pairs are stored once, canonically ordered so that `filename_a < filename_b`;
+    the unique pair index also serves lookups by `filename_a`.
     """
+    __table_args__ = (
+        Index('uq_duplicate_pair', 'filename_a', 'filename_b', unique=True),
+        Index('ix_duplicate_filename_b', 'filename_b'),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    filename_a: str = Field(index=True)
-    filename_b: str = Field(index=True)
+    filename_a: str
+    filename_b: str
     is_false_positive: bool = Field(default=False, index=True)
-    created_at: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
+    created_at: datetime.datetime = Field(default_factory=_utcnow)
 
 
 class DuplicateGroup(SQLModel, table=True):
     """Represents a detected group of visually similar memes."""
     id: Optional[int] = Field(default=None, primary_key=True)
-    created_at: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
+    created_at: datetime.datetime = Field(default_factory=_utcnow)
 
 
 class MemeDuplicateGroup(SQLModel, table=True):
@@ -51,5 +70,15 @@ class MemeDuplicateGroup(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     group_id: int = Field(index=True)
     filename: str = Field(index=True)
-    created_at: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
+    created_at: datetime.datetime = Field(default_factory=_utcnow)
+
 
+class PhashCache(SQLModel, table=True):
+    """Content-addressed phash cache.
+
+    Keyed by the SHA-1 of the file bytes so a re-imported or renamed file
+    reuses its perceptual hash instead of recomputing it.
+    """
+    sha1: str = Field(primary_key=True)
+    phash: str
+    created_at: datetime.datetime = Field(default_factory=_utcnow)
@@ -1,54 +1,145 @@
+import functools
 import hashlib
 import os
 import logging
+import stat
 import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
-from typing import Any
+from typing import Any, Mapping, Optional, Sequence
 
 import asyncio
 from PIL import Image
 
-from .constants import CACHE_DIR, PREVIEW_CACHE_METADATA, PREVIEW_JPEG_QUALITY_IMAGE
+from .constants import (
+    CACHE_DIR,
+    PREVIEW_CACHE_METADATA,
+    PREVIEW_JPEG_QUALITY_IMAGE,
+    PREVIEW_POOL_MAX_WORKERS,
+    PREVIEW_PREFETCH_CONCURRENCY,
+    PREVIEW_PREFETCH_RADIUS,
+)
 from .storage_helpers import call_storage
 
 logger = logging.getLogger(__name__)
 
+_PREVIEW_POOL: Optional[ProcessPoolExecutor] = None
+_PREVIEW_POOL_LOCK = threading.Lock()
+
+# Most recently served previews, keyed by cache path, so repeated requests
+# (gallery scrolling) skip the stat + open + read of the disk cache.
+_MEM_CACHE: "OrderedDict[str, bytes]" = OrderedDict()
+_MEM_CACHE_MAX = 256
+_MEM_CACHE_LOCK = threading.Lock()
+
+# Cache files used to be keyed by MD5 of the filename; the first cleanup pass
+# renames those to their current names instead of treating them as orphans.
+_LEGACY_NAMES_MIGRATED = False
+
+
+@functools.lru_cache(maxsize=4096)
+def _cache_name(filename: str) -> str:
+    """Cache file name for `filename` (BLAKE2b-128 of the name; pure, so memoized)."""
+    return hashlib.blake2b(filename.encode('utf-8'), digest_size=16).hexdigest() + '.jpg'
+
 
 def _cache_path(filename: str) -> str:
-    name_hash = hashlib.md5(filename.encode()).hexdigest()
-    return os.path.join(CACHE_DIR, f"{name_hash}.jpg")
+    return os.path.join(CACHE_DIR, _cache_name(filename))
+
+
+def _mem_cache_get(cache_path: str) -> Optional[bytes]:
+    with _MEM_CACHE_LOCK:
+        data = _MEM_CACHE.get(cache_path)
+        if data is not None:
+            _MEM_CACHE.move_to_end(cache_path)
+        return data
+
+
+def _mem_cache_put(cache_path: str, data: bytes) -> None:
+    with _MEM_CACHE_LOCK:
+        _MEM_CACHE[cache_path] = data
+        _MEM_CACHE.move_to_end(cache_path)
+        while len(_MEM_CACHE) > _MEM_CACHE_MAX:
+            _MEM_CACHE.popitem(last=False)
+
+
+def _mem_cache_discard(cache_path: str) -> None:
+    with _MEM_CACHE_LOCK:
+        _MEM_CACHE.pop(cache_path, None)
+
+
+def _encode_preview(data: bytes, size: int) -> bytes:
+    """Turn source image bytes into a JPEG preview no larger than `size` x `size`.
+
+    A JPEG that is already small enough is returned as-is, skipping a decode and
+    a lossy re-encode. Larger JPEGs are decoded at reduced scale by `thumbnail`
+    (libjpeg DCT scaling via `draft`), so the full image is never materialized.
+    """
+    img = Image.open(BytesIO(data))
+    if img.format == 'JPEG' and img.mode in ('RGB', 'L') and max(img.size) <= size:
+        return data
+
+    img.thumbnail((size, size), Image.Resampling.LANCZOS)
+    if img.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+        img = background
+
+    with BytesIO() as bio:
+        img.save(bio, format='JPEG', quality=PREVIEW_JPEG_QUALITY_IMAGE)
+        return bio.getvalue()
+
+
+def _preview_pool() -> ProcessPoolExecutor:
+    """Process pool for preview encoding, created on first use.
+
+    Decoding, resizing and JPEG encoding hold the GIL for most of their run,
+    so threads would serialize concurrent preview requests.
+    """
+    global _PREVIEW_POOL
+    with _PREVIEW_POOL_LOCK:
+        if _PREVIEW_POOL is None:
+            _PREVIEW_POOL = ProcessPoolExecutor(max_workers=min(PREVIEW_POOL_MAX_WORKERS, os.cpu_count() or 1))
+        return _PREVIEW_POOL
+
+
+def shutdown_preview_pool() -> None:
+    """Stop the preview encoder processes; the pool is recreated on next use."""
+    global _PREVIEW_POOL
+    with _PREVIEW_POOL_LOCK:
+        pool, _PREVIEW_POOL = _PREVIEW_POOL, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
 
 
 def generate_preview(filename: str, is_vid: bool, storage: Any, size: int = 300) -> bytes:
     """Sync preview generation (uses sync storage methods)."""
     cache_path = _cache_path(filename)
+    cached = _mem_cache_get(cache_path)
+    if cached is not None:
+        return cached
     if os.path.isfile(cache_path):
         try:
             with open(cache_path, 'rb') as f:
-                return f.read()
+                cached = f.read()
+            _mem_cache_put(cache_path, cached)
+            return cached
         except Exception:
             pass
 
     if is_vid:
-        frame_data = storage.extract_video_frame(filename, timestamp=1.0)
-        if not frame_data:
+        data = storage.extract_video_frame(filename, timestamp=1.0)
+        if not data:
             raise FileNotFoundError(filename)
-        img = Image.open(BytesIO(frame_data))
     else:
         data = storage.download_file(filename)
         if data is None:
             raise FileNotFoundError(filename)
-        img = Image.open(BytesIO(data))
-
-    img.thumbnail((size, size), Image.Resampling.LANCZOS)
-    if img.mode in ('RGBA', 'LA', 'P'):
-        background = Image.new('RGB', img.size, (255, 255, 255))
-        background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-        img = background
 
-    with BytesIO() as bio:
-        img.save(bio, format='JPEG', quality=PREVIEW_JPEG_QUALITY_IMAGE)
-        preview_bytes = bio.getvalue()
+    preview_bytes = _encode_preview(data, size)
+    _mem_cache_put(cache_path, preview_bytes)
 
     try:
         os.makedirs(CACHE_DIR, exist_ok=True)
@@ -63,38 +154,34 @@ def generate_preview(filename: str, is_vid: bool, storage: Any, size: int = 300)
 async def async_generate_preview(filename: str, is_vid: bool, storage: Any, size: int = 300) -> bytes:
     """Async preview generation using `call_storage` to dispatch to async/sync storage methods."""
     cache_path = _cache_path(filename)
+    cached = _mem_cache_get(cache_path)
+    if cached is not None:
+        return cached
     if os.path.isfile(cache_path):
         try:
             with open(cache_path, 'rb') as f:
-                return f.read()
+                cached = f.read()
+            _mem_cache_put(cache_path, cached)
+            return cached
         except Exception:
             pass
 
     try:
         if is_vid:
-            frame_data = await call_storage(storage, 'extract_video_frame', filename, timestamp=1.0)
-            if not frame_data:
+            data = await call_storage(storage, 'extract_video_frame', filename, timestamp=1.0)
+            if not data:
                 raise FileNotFoundError(filename)
-            img = Image.open(BytesIO(frame_data))
         else:
             data = await call_storage(storage, 'download_file', filename)
             if data is None:
                 raise FileNotFoundError(filename)
-            img = Image.open(BytesIO(data))
-
-        img.thumbnail((size, size), Image.Resampling.LANCZOS)
-        if img.mode in ('RGBA', 'LA', 'P'):
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-            img = background
 
-        with BytesIO() as bio:
-            img.save(bio, format='JPEG', quality=PREVIEW_JPEG_QUALITY_IMAGE)
-            preview_bytes = bio.getvalue()
+        loop = asyncio.get_running_loop()
+        preview_bytes = await loop.run_in_executor(_preview_pool(), _encode_preview, data, size)
+        _mem_cache_put(cache_path, preview_bytes)
 
         try:
             os.makedirs(CACHE_DIR, exist_ok=True)
-            loop = asyncio.get_running_loop()
             def _write_cache():
                 with open(cache_path, 'wb') as f:
                     f.write(preview_bytes)
@@ -110,6 +197,35 @@ async def async_generate_preview(filename: str, is_vid: bool, storage: Any, size
         raise
 
 
+async def prefetch_previews(
+    filenames: Sequence[str],
+    is_vid_map: Mapping[str, bool],
+    storage: Any,
+    size: int = 300,
+    radius: int = PREVIEW_PREFETCH_RADIUS,
+) -> int:
+    """Warm the preview caches for the first `radius` of `filenames`.
+
+    Best effort: failures are logged at debug level and skipped. Returns the
+    number of previews that are now cached.
+    """
+    semaphore = asyncio.Semaphore(PREVIEW_PREFETCH_CONCURRENCY)
+
+    async def warm(filename: str) -> bool:
+        if _mem_cache_get(_cache_path(filename)) is not None:
+            return True
+        async with semaphore:
+            try:
+                await async_generate_preview(filename, is_vid_map.get(filename, False), storage, size=size)
+                return True
+            except Exception as e:
+                logger.debug('Prefetch of preview for %s failed: %s', filename, e)
+                return False
+
+    results = await asyncio.gather(*(warm(f) for f in filenames[:radius]))
+    return sum(results)
+
+
 def save_preview_cache() -> int:
     """
     Save the current preview cache to disk.
@@ -131,17 +247,16 @@ def save_preview_cache() -> int:
         
         cached_files = []
         try:
-            all_files = os.listdir(CACHE_DIR)
-            logger.debug(f"Files in {CACHE_DIR}: {all_files}")
-            for filename in all_files:
-                if filename.endswith('.jpg'):
-                    file_path = os.path.join(CACHE_DIR, filename)
-                    try:
-                        # Only include files with actual content (> 0 bytes)
-                        if os.path.getsize(file_path) > 0:
-                            cached_files.append(filename)
-                    except OSError:
-                        pass
+            with os.scandir(CACHE_DIR) as it:
+                for entry in it:
+                    # is_file() comes from readdir; only the size needs a stat
+                    if entry.name.endswith('.jpg') and entry.is_file(follow_symlinks=False):
+                        try:
+                            # Only include files with actual content (> 0 bytes)
+                            if entry.stat(follow_symlinks=False).st_size > 0:
+                                cached_files.append(entry.name)
+                        except OSError:
+                            pass
         except OSError as e:
             logger.warning(f"Failed to list files in {CACHE_DIR}: {e}")
             return 0
@@ -190,11 +305,14 @@ def restore_preview_cache() -> int:
         for filename in cached_files:
             cache_path = os.path.join(CACHE_DIR, filename)
             try:
-                # Verify file exists AND has content (size > 0)
-                if os.path.isfile(cache_path) and os.path.getsize(cache_path) > 0:
+                # Verify file exists AND has content (size > 0), with a single stat
+                st = os.stat(cache_path)
+                if stat.S_ISREG(st.st_mode) and st.st_size > 0:
                     verified_count += 1
                 else:
                     logger.debug(f"Cache file missing or empty: {filename}")
+            except FileNotFoundError:
+                logger.debug(f"Cache file missing or empty: {filename}")
             except Exception as e:
                 logger.debug(f"Failed to verify cache file {filename}: {e}")
         
@@ -217,6 +335,7 @@ def remove_cache_entry(filename: str) -> bool:
     """
     try:
         cache_path = _cache_path(filename)
+        _mem_cache_discard(cache_path)
         if os.path.isfile(cache_path):
             os.remove(cache_path)
             logger.debug(f"Removed cache entry for: {filename}")
@@ -227,6 +346,37 @@ def remove_cache_entry(filename: str) -> bool:
         return False
 
 
+def _migrate_legacy_names(all_files: list, valid_filenames: set, valid_names: set) -> list:
+    """Rename MD5-keyed cache files of `valid_filenames` to their current names.
+
+    Returns `all_files` with migrated entries under their new names.
+    """
+    legacy = {hashlib.md5(f.encode()).hexdigest() + '.jpg': _cache_name(f) for f in valid_filenames}
+    present = set(all_files)
+    migrated = 0
+    result = []
+    for filename in all_files:
+        new_name = legacy.get(filename)
+        if new_name is None or filename in valid_names:
+            result.append(filename)
+            continue
+        if new_name in present:
+            # Already re-encoded under the new name; the old copy is dropped as an orphan
+            result.append(filename)
+            continue
+        try:
+            os.replace(os.path.join(CACHE_DIR, filename), os.path.join(CACHE_DIR, new_name))
+            present.add(new_name)
+            result.append(new_name)
+            migrated += 1
+        except OSError as e:
+            logger.warning(f"Failed to migrate legacy cache file {filename}: {e}")
+            result.append(filename)
+    if migrated:
+        logger.info(f"Migrated {migrated} preview cache files to BLAKE2b names")
+    return result
+
+
 def cleanup_orphaned_cache(valid_filenames: set) -> int:
     """
     Remove cache entries that don't have corresponding filenames in the provided set.
@@ -249,20 +399,19 @@ def cleanup_orphaned_cache(valid_filenames: set) -> int:
             logger.warning(f"Failed to list files in {CACHE_DIR}: {e}")
             return 0
         
+        valid_names = {_cache_name(f) for f in valid_filenames}
+        global _LEGACY_NAMES_MIGRATED
+        if not _LEGACY_NAMES_MIGRATED:
+            all_files = _migrate_legacy_names(all_files, valid_filenames, valid_names)
+            _LEGACY_NAMES_MIGRATED = True
         for filename in all_files:
             if not filename.endswith('.jpg'):
                 continue
             
-            # Check if this cache file corresponds to any valid filename
-            is_orphaned = True
-            for valid_filename in valid_filenames:
-                if _cache_path(valid_filename) == os.path.join(CACHE_DIR, filename):
-                    is_orphaned = False
-                    break
-            
-            if is_orphaned:
+            if filename not in valid_names:
                 try:
                     cache_path = os.path.join(CACHE_DIR, filename)
+                    _mem_cache_discard(cache_path)
                     os.remove(cache_path)
                     logger.debug(f"Removed orphaned cache file: {filename}")
                     removed_count += 1
@@ -1,27 +1,54 @@
 """Whoosh full-text search indexing and querying for memes."""
 
+import atexit
+import functools
 import os
 import shutil
 import logging
+import threading
+import time
+from typing import List, Optional
 from whoosh.filedb.filestore import FileStorage
 from whoosh.fields import Schema, TEXT, ID, KEYWORD
 from whoosh.qparser import QueryParser, OrGroup
+from whoosh.writing import BufferedWriter
 from .db_helpers import session_scope
 from .models import Meme
-from .constants import INDEX_DIR
+from .constants import (
+    INDEX_DIR,
+    INDEX_WRITER_BUFFER_LIMIT,
+    INDEX_WRITER_FLUSH_SECONDS,
+    REBUILD_FETCH_SIZE,
+    REBUILD_WRITER_LIMIT_MB,
+)
 from sqlmodel import select
 
 logger = logging.getLogger(__name__)
 
+# Long-lived writer shared by add/remove so single-document updates are
+# buffered in memory instead of each committing a new segment. It holds the
+# index write lock while open; searches read through it to see buffered docs.
+_WRITER: Optional[BufferedWriter] = None
+_WRITER_DIR: Optional[str] = None
+_WRITER_FLUSHED_AT = 0.0
+_WRITER_LOCK = threading.RLock()
+# Daemon timer that commits whatever is still buffered once the flush interval
+# has passed, so the last edit of a burst does not wait for the next write.
+_FLUSH_TIMER: Optional[threading.Timer] = None
+
 def get_schema() -> Schema:
-    """Define Whoosh schema for memes."""
+    """Define Whoosh schema for memes.
+
+    The long text fields are indexed but not stored; search_memes reads them
+    back from the database by id.
+    """
     return Schema(
         id=ID(stored=True),
         filename=TEXT(stored=True, field_boost=2.0),
-        description=TEXT(stored=True),
-        category=TEXT(stored=True, field_boost=1.5),
-        keywords=TEXT(stored=True, field_boost=1.5),
-        text_in_image=TEXT(stored=True),
+        description=TEXT(stored=False),
+        category=TEXT(stored=False, field_boost=1.5),
+        keywords=TEXT(stored=False, field_boost=1.5),
+        text_in_image=TEXT(stored=False),
         status=KEYWORD(stored=True),
         processed=KEYWORD(stored=True),
     )
@@ -40,10 +67,112 @@ def init_index() -> None:
         storage.create_index(schema)
 
 
+@functools.lru_cache(maxsize=1)
+def _open_index(index_dir: str):
+    """Open the index at `index_dir`, reusing the handle across calls.
+
+    Writers opened from the handle still see later commits; the cache is
+    cleared when rebuild_index replaces the index.
+    """
+    return FileStorage(index_dir).open_index()
+
+
+@functools.lru_cache(maxsize=1)
+def _query_parser() -> QueryParser:
+    """Query parser for the fixed schema; building one instantiates every plugin."""
+    return QueryParser("description", schema=get_schema(), group=OrGroup)
+
+
+def _close_writer_locked(commit: bool) -> None:
+    global _WRITER, _WRITER_DIR, _FLUSH_TIMER
+    writer, _WRITER, _WRITER_DIR = _WRITER, None, None
+    if _FLUSH_TIMER is not None:
+        _FLUSH_TIMER.cancel()
+        _FLUSH_TIMER = None
+    if writer is None:
+        return
+    try:
+        if commit:
+            writer.close()
+        else:
+            writer.writer.cancel()
+    except Exception as e:
+        logger.warning("Failed to close search index writer: %s", e)
+
+
+def _get_writer(create: bool = True) -> Optional[BufferedWriter]:
+    """Return the shared buffered writer for INDEX_DIR, opening it on first use.
+
+    With `create=False`, returns None instead of creating a missing index.
+    """
+    global _WRITER, _WRITER_DIR, _WRITER_FLUSHED_AT
+    with _WRITER_LOCK:
+        if _WRITER is not None and _WRITER_DIR == INDEX_DIR:
+            return _WRITER
+        _close_writer_locked(commit=True)
+
+        try:
+            ix = _open_index(INDEX_DIR)
+        except:
+            if not create:
+                return None
+            os.makedirs(INDEX_DIR, exist_ok=True)
+            ix = FileStorage(INDEX_DIR).create_index(get_schema())
+
+        # No Whoosh timer: its threads are non-daemon and would block interpreter
+        # exit, so staleness is bounded by _maybe_flush and _FLUSH_TIMER instead.
+        _WRITER = BufferedWriter(ix, period=None, limit=INDEX_WRITER_BUFFER_LIMIT)
+        _WRITER_DIR = INDEX_DIR
+        _WRITER_FLUSHED_AT = time.monotonic()
+        return _WRITER
+
+
+def _maybe_flush(writer: BufferedWriter) -> None:
+    global _WRITER_FLUSHED_AT, _FLUSH_TIMER
+    now = time.monotonic()
+    if now - _WRITER_FLUSHED_AT >= INDEX_WRITER_FLUSH_SECONDS:
+        writer.commit()
+        _WRITER_FLUSHED_AT = now
+    elif _FLUSH_TIMER is None:
+        _FLUSH_TIMER = threading.Timer(INDEX_WRITER_FLUSH_SECONDS, _timed_flush, args=(writer,))
+        _FLUSH_TIMER.daemon = True
+        _FLUSH_TIMER.start()
+
+
+def _timed_flush(writer: BufferedWriter) -> None:
+    global _WRITER_FLUSHED_AT, _FLUSH_TIMER
+    with _WRITER_LOCK:
+        if _FLUSH_TIMER is None or _WRITER is not writer:
+            return
+        _FLUSH_TIMER = None
+        try:
+            writer.commit()
+            _WRITER_FLUSHED_AT = time.monotonic()
+        except Exception as e:
+            logger.warning("Failed to flush search index writer: %s", e)
+
+
+def close_index_writer() -> None:
+    """Flush buffered index changes to disk and release the index write lock."""
+    with _WRITER_LOCK:
+        _close_writer_locked(commit=True)
+
+
+atexit.register(close_index_writer)
+
+
 def rebuild_index(engine) -> None:
     """Rebuild the search index from database."""
     logger.info("Rebuilding Whoosh search index...")
-    
+    # Held throughout so concurrent add/remove calls cannot reopen a writer on
+    # the index while it is being deleted and recreated.
+    with _WRITER_LOCK:
+        # The index is about to be replaced; buffered changes are superseded.
+        _close_writer_locked(commit=False)
+        _rebuild_index_locked(engine)
+
+
+def _rebuild_index_locked(engine) -> None:
     os.makedirs(INDEX_DIR, exist_ok=True)
     schema = get_schema()
     
@@ -58,13 +187,17 @@ def rebuild_index(engine) -> None:
     storage = FileStorage(INDEX_DIR)
     
     ix = storage.create_index(schema)
-    writer = ix.writer()
+    _open_index.cache_clear()
+    # A larger in-memory pool keeps the whole rebuild in as few segments as possible
+    writer = ix.writer(limitmb=REBUILD_WRITER_LIMIT_MB)
     
     try:
         with session_scope(engine) as session:
-            memes = session.exec(select(Meme).where(Meme.status != 'removed')).all()
+            memes = session.exec(select(Meme).where(Meme.status != 'removed')).yield_per(REBUILD_FETCH_SIZE)
 
+            count = 0
             for meme in memes:
+                count += 1
                 writer.add_document(
                     id=str(meme.id),
                     filename=meme.filename or '',
@@ -77,7 +210,7 @@ def rebuild_index(engine) -> None:
                 )
             
             writer.commit()
-            logger.info("Indexed %d memes", len(memes))
+            logger.info("Indexed %d memes", count)
     except Exception as e:
         logger.exception("Failed to rebuild index: %s", e)
         writer.cancel()
@@ -86,30 +219,21 @@ def rebuild_index(engine) -> None:
 def add_meme_to_index(meme: Meme) -> None:
     """Add or update a meme in the search index."""
     try:
-        os.makedirs(INDEX_DIR, exist_ok=True)
-        schema = get_schema()
-        storage = FileStorage(INDEX_DIR)
-        
-        try:
-            ix = storage.open_index()
-        except:
-            ix = storage.create_index(schema)
-        
-        writer = ix.writer()
-        writer.delete_by_term('id', str(meme.id))
-        
-        writer.add_document(
-            id=str(meme.id),
-            filename=meme.filename or '',
-            description=meme.description or '',
-            category=meme.category or '',
-            keywords=meme.keywords or '',
-            text_in_image=meme.text_in_image or '',
-            status=meme.status,
-            processed='true' if meme.status == 'filled' else 'false',
-        )
-        
-        writer.commit()
+        with _WRITER_LOCK:
+            writer = _get_writer()
+            writer.delete_by_term('id', str(meme.id))
+            
+            writer.add_document(
+                id=str(meme.id),
+                filename=meme.filename or '',
+                description=meme.description or '',
+                category=meme.category or '',
+                keywords=meme.keywords or '',
+                text_in_image=meme.text_in_image or '',
+                status=meme.status,
+                processed='true' if meme.status == 'filled' else 'false',
+            )
+            _maybe_flush(writer)
         logger.debug("Added/updated meme %s in search index", meme.filename)
     except Exception as e:
         logger.warning("Failed to add meme to index: %s", e)
@@ -117,24 +241,42 @@ def add_meme_to_index(meme: Meme) -> None:
 def remove_meme_from_index(meme_id: int) -> None:
     """Remove a meme from the search index."""
     try:
-        storage = FileStorage(INDEX_DIR)
-        try:
-            ix = storage.open_index()
-        except:
-            logger.debug("Search index not found, nothing to remove")
-            return
-        
-        try:
-            writer = ix.writer()
+        with _WRITER_LOCK:
+            writer = _get_writer(create=False)
+            if writer is None:
+                logger.debug("Search index not found, nothing to remove")
+                return
+            
             writer.delete_by_term('id', str(meme_id))
-            writer.commit()
-            logger.debug("Removed meme %d from search index", meme_id)
-        except Exception as e:
-            logger.warning("Failed to remove meme from index: %s", e)
+            _maybe_flush(writer)
+        logger.debug("Removed meme %d from search index", meme_id)
     except Exception as e:
         logger.warning("Failed to remove meme from index: %s", e)
 
-def search_memes(query_text: str, limit: int = 50, offset: int = 0) -> List[dict]:
+def _fill_from_db(engine, memes: List[dict]) -> List[dict]:
+    """Replace index hits with current DB values, dropping hits with no row."""
+    ids = [m['id'] for m in memes]
+    with session_scope(engine) as session:
+        rows = {r.id: r for r in session.exec(select(Meme).where(Meme.id.in_(ids)))}
+    filled = []
+    for m in memes:
+        row = rows.get(m['id'])
+        if row is None:
+            continue
+        m.update(
+            filename=row.filename,
+            description=row.description or '',
+            category=row.category or '',
+            keywords=row.keywords or '',
+            text_in_image=row.text_in_image or '',
+            status=row.status,
+            processed=row.status == 'filled',
+        )
+        filled.append(m)
+    return filled
+
+
+def search_memes(query_text: str, limit: int = 50, offset: int = 0, engine=None) -> List[dict]:
     """
     Search memes using Whoosh full-text search.
     
@@ -148,6 +290,8 @@ def search_memes(query_text: str, limit: int = 50, offset: int = 0) -> List[dict
         query_text: Search query string
         limit: Maximum results to return
         offset: Results offset for pagination
+        engine: Database engine used to fill in the text fields, which the
+            index does not store. Without it those fields are empty.
     
     Returns:
         List of matching meme documents
@@ -156,24 +300,18 @@ def search_memes(query_text: str, limit: int = 50, offset: int = 0) -> List[dict
         return []
     
     try:
-        storage = FileStorage(INDEX_DIR)
-        try:
-            ix = storage.open_index()
-        except:
-            logger.warning("Search index not found")
-            return []
-        
-        ix = storage.open_index()
-        searcher = ix.searcher()
-        
-        parser = QueryParser(
-            "description",
-            schema=ix.schema,
-            group=OrGroup,
-        )
+        # Every search reads through the shared buffered writer, so unflushed
+        # updates are visible. Each gets its own reader (opened under the lock,
+        # so no commit swaps segments mid-open) and closes it when done.
+        with _WRITER_LOCK:
+            writer = _get_writer(create=False)
+            if writer is None:
+                logger.warning("Search index not found")
+                return []
+            searching = writer.searcher()
         
         try:
-            query = parser.parse(query_text)
+            query = _query_parser().parse(query_text)
         except Exception as e:
             logger.debug("Query parse error (fallback to simple search): %s", e)
             from whoosh.query import And, Term
@@ -185,24 +323,26 @@ def search_memes(query_text: str, limit: int = 50, offset: int = 0) -> List[dict
             ]
             query = And(terms) if terms else Term("description", query_text)
         
-        results = searcher.search(query, limit=limit + offset)
-        results.fragmenter.charlimit = None
-        
-        memes = []
-        for i, result in enumerate(results[offset : offset + limit]):
-            memes.append({
-                'id': int(result['id']),
-                'filename': result['filename'],
-                'description': result.get('description', ''),
-                'category': result.get('category', ''),
-                'keywords': result.get('keywords', ''),
-                'text_in_image': result.get('text_in_image', ''),
-                'status': result.get('status', 'unknown'),
-                'processed': result.get('processed', 'false') == 'true',
-                'score': result.score,
-            })
+        with searching as searcher:
+            results = searcher.search(query, limit=limit + offset)
+            results.fragmenter.charlimit = None
+            
+            memes = []
+            for i, result in enumerate(results[offset : offset + limit]):
+                memes.append({
+                    'id': int(result['id']),
+                    'filename': result['filename'],
+                    'description': result.get('description', ''),
+                    'category': result.get('category', ''),
+                    'keywords': result.get('keywords', ''),
+                    'text_in_image': result.get('text_in_image', ''),
+                    'status': result.get('status', 'unknown'),
+                    'processed': result.get('processed', 'false') == 'true',
+                    'score': result.score,
+                })
         
-        searcher.close()
+        if engine is not None and memes:
+            memes = _fill_from_db(engine, memes)
         logger.debug("Search for '%s' returned %d results", query_text, len(memes))
         return memes
         
@@ -6,84 +6,185 @@ import tempfile
 import time
 from typing import Any, Dict, List, Optional
 
+import httpx
 from webdav4.client import Client
 from .constants import *
 
 logger = logging.getLogger(__name__)
 
 
+def _read_into_buffer(f: Any, size_hint: int) -> bytes:
+    """Fill a `size_hint`-byte buffer from `f`, trimming or extending it if the hint was wrong.
+
+    Returns immutable bytes, like f.read(), so callers can hash or key on the result.
+    """
+    buf = bytearray(size_hint)
+    filled = 0
+    with memoryview(buf) as view:
+        while filled < size_hint:
+            n = f.readinto(view[filled:])
+            if not n:
+                break
+            filled += n
+    if filled < size_hint:
+        del buf[filled:]
+    else:
+        rest = f.read()
+        if rest:
+            buf += rest
+    return bytes(buf)
+
+
+def _remote_path(path: Any) -> str:
+    """Absolute WebDAV path for `path` (a leading slash is added if missing)."""
+    p = str(path)
+    return p if p[:1] == '/' else '/' + p.lstrip('/')
+
+
+_NOT_FOUND_MARKERS = ('404', 'not found', 'does not exist', 'resource not found')
+
+
+def _is_not_found(exc: BaseException) -> bool:
+    """Whether a client error means the remote file does not exist.
+
+    The exception type is checked first (webdav4 raises ResourceNotFound); the
+    message is only formatted and scanned for other error types.
+    """
+    if 'notfound' in type(exc).__name__.lower():
+        return True
+    error_str = str(exc).lower()
+    return any(marker in error_str for marker in _NOT_FOUND_MARKERS)
+
+
+def _entry_meta(entry: Any, path: str) -> Optional[Dict[str, Any]]:
+    """Normalize one `Client.ls` entry (a detail dict or a bare name) listed under `path`."""
+    if isinstance(entry, dict):
+        rel = entry.get('name') or entry.get('href')
+        if rel is None:
+            return None
+        rel = str(rel)
+        full_path = rel if rel.startswith('/') else path.rstrip('/') + '/' + rel.lstrip('/')
+        name = rel.rstrip('/').split('/')[-1]
+        typ = entry.get('type') or entry.get('resource_type')
+        is_dir = None
+        if typ is not None:
+            is_dir = str(typ).lower() == 'directory'
+    elif isinstance(entry, str):
+        rel = entry
+        full_path = rel if rel.startswith('/') else path.rstrip('/') + '/' + rel.lstrip('/')
+        name = full_path.rstrip('/').split('/')[-1]
+        is_dir = None
+    else:
+        return None
+
+    if is_dir is None:
+        is_dir = str(full_path).endswith('/')
+
+    meta = {
+        'path': full_path,
+        'name': name,
+        'is_dir': is_dir,
+    }
+    try:
+        if isinstance(entry, dict):
+            # webdav4's ls() reports 'content_length'/'created'/'modified'; raw DAV names are kept too
+            for k in ('getlastmodified', 'modified', 'creationdate', 'getcreationdate', 'created',
+                      'getcontentlength', 'content_length', 'size'):
+                if k in entry and entry.get(k) is not None:
+                    if k in ('getcontentlength', 'content_length'):
+                        try:
+                            meta['size'] = int(entry.get(k))
+                        except (ValueError, TypeError):
+                            meta['size'] = 0
+                    elif k == 'created':
+                        meta.setdefault('creationdate', entry.get(k))
+                    else:
+                        meta[k] = entry.get(k)
+    except Exception:
+        pass
+    return meta
+
+
 class WebDavStorage:
-    def __init__(self, base_url: str, auth: Optional[tuple] = None):
-        self.client = Client(base_url, auth=auth)
+    def __init__(self, base_url: str, auth: Optional[tuple] = None, max_connections: Optional[int] = None):
+        client_opts = {}
+        if max_connections:
+            # Keep one idle connection per storage worker so requests reuse them
+            # instead of reconnecting (and re-handshaking TLS) under load.
+            client_opts['limits'] = httpx.Limits(
+                max_keepalive_connections=max_connections,
+                max_connections=max_connections * 2,
+            )
+        self.client = Client(base_url, auth=auth, **client_opts)
+
+    def list_files(self, path: str, recursive: bool = False, use_deep_propfind: bool = True) -> List[Dict[str, Any]]:
+        """List entries under `path`.
+
+        A recursive listing is fetched with a single `Depth: infinity` PROPFIND when
+        `use_deep_propfind` is set. Servers that refuse it (many disable infinite
+        depth) fall back to one `Depth: 1` listing per directory.
+        """
+        if recursive and use_deep_propfind:
+            try:
+                entries = self._propfind_deep(path)
+            except Exception as exc:
+                logger.debug("Deep PROPFIND of %s failed (%s); listing directories one by one", path, exc)
+            else:
+                return [meta for meta in (_entry_meta(entry, path) for entry in entries) if meta is not None]
 
-    def list_files(self, path: str, recursive: bool = False) -> List[Dict[str, Any]]:
         results: List[Dict[str, Any]] = []
         entries = self.client.ls(path)
         for entry in entries:
-            if isinstance(entry, dict):
-                rel = entry.get('name') or entry.get('href')
-                if rel is None:
-                    continue
-                rel = str(rel)
-                full_path = rel if rel.startswith('/') else path.rstrip('/') + '/' + rel.lstrip('/')
-                name = rel.rstrip('/').split('/')[-1]
-                typ = entry.get('type') or entry.get('resource_type')
-                is_dir = None
-                if typ is not None:
-                    is_dir = str(typ).lower() == 'directory'
-            elif isinstance(entry, str):
-                rel = entry
-                full_path = rel if rel.startswith('/') else path.rstrip('/') + '/' + rel.lstrip('/')
-                name = full_path.rstrip('/').split('/')[-1]
-                is_dir = None
-            else:
+            meta = _entry_meta(entry, path)
+            if meta is None:
                 continue
-
-            if is_dir is None:
-                is_dir = str(full_path).endswith('/')
-
-            meta = {
-                'path': full_path,
-                'name': name,
-                'is_dir': is_dir,
-            }
-            try:
-                if isinstance(entry, dict):
-                    for k in ('getlastmodified', 'modified', 'creationdate', 'getcreationdate', 'getcontentlength', 'size'):
-                        if k in entry and entry.get(k) is not None:
-                            if k == 'getcontentlength':
-                                try:
-                                    meta['size'] = int(entry.get(k))
-                                except (ValueError, TypeError):
-                                    meta['size'] = 0
-                            else:
-                                meta[k] = entry.get(k)
-            except Exception:
-                pass
             results.append(meta)
 
             if recursive and meta['is_dir']:
                 try:
-                    subresults = self.list_files(full_path, recursive=recursive)
+                    subresults = self.list_files(meta['path'], recursive=recursive, use_deep_propfind=False)
                     results.extend(subresults)
                 except Exception:
                     pass
 
         return results
 
-    def download_file(self, path: str) -> bytes:
-        remote = path if str(path).startswith('/') else '/' + str(path).lstrip('/')
+    def _propfind_deep(self, path: str) -> List[Dict[str, Any]]:
+        """Fetch the whole subtree under `path` in one PROPFIND, shaped like `Client.ls` entries.
+
+        Names are made absolute (relative to the server's base URL) so entries from
+        nested directories keep their full path.
+        """
+        result = self.client.propfind(path, headers={'Depth': 'infinity'}, follow_redirects=True)
+        root = self.client.join_url(path).path.rstrip('/')
+        entries: List[Dict[str, Any]] = []
+        for key, response in result.responses.items():
+            if key.rstrip('/') == root:
+                continue
+            entries.append({
+                'name': '/' + response.path_relative_to(self.client.base_url).lstrip('/'),
+                'href': response.href,
+                **response.properties.as_dict(),
+            })
+        return entries
+
+    def download_file(self, path: str, size_hint: Optional[int] = None) -> bytes:
+        """Download a file's contents.
+
+        When `size_hint` (e.g. the listing's content length) is given, the body is
+        read into a single preallocated buffer instead of being grown chunk by chunk.
+        """
+        remote = _remote_path(path)
         try:
             with self.client.open(remote, mode='rb') as f:
-                data = f.read()
+                if size_hint and hasattr(f, 'readinto'):
+                    data = _read_into_buffer(f, size_hint)
+                else:
+                    data = f.read()
         except FileNotFoundError:
             raise
         except Exception as exc:
-            error_str = str(exc).lower()
-            if any(x in error_str for x in ['404', 'not found', 'does not exist', 'resource not found']):
-                raise FileNotFoundError(f"File not found: {remote}") from exc
-            
-            if 'notfound' in exc.__class__.__name__.lower():
+            if _is_not_found(exc):
                 raise FileNotFoundError(f"File not found: {remote}") from exc
             raise IOError(f"Failed to download {remote}: {exc}") from exc
         if isinstance(data, str):
@@ -92,39 +193,47 @@ class WebDavStorage:
 
     def upload_fileobj(self, path: str, data: bytes, overwrite: bool = True) -> None:
         try:
-            self.client.upload_fileobj(io.BytesIO(data), path if str(path).startswith('/') else '/' + str(path).lstrip('/'), overwrite=overwrite)
+            self.client.upload_fileobj(io.BytesIO(data), _remote_path(path), overwrite=overwrite)
         except FileNotFoundError:
             raise
         except Exception as exc:
             raise IOError(f"Failed to upload {path}: {exc}") from exc
 
     def open(self, path: str, mode: str = 'rb'):
-        remote = path if str(path).startswith('/') else '/' + str(path).lstrip('/')
+        remote = _remote_path(path)
         return self.client.open(remote, mode=mode)
 
     def delete_file(self, path: str) -> None:
         """Delete a file from WebDAV storage."""
-        remote = path if str(path).startswith('/') else '/' + str(path).lstrip('/')
+        remote = _remote_path(path)
         try:
             self.client.remove(remote)
         except FileNotFoundError:
             raise
         except Exception as exc:
-            error_str = str(exc).lower()
-            
-            if any(x in error_str for x in ['404', 'not found', 'does not exist', 'resource not found']):
-                raise FileNotFoundError(f"File not found: {remote}") from exc
-            
-            if 'notfound' in exc.__class__.__name__.lower():
+            if _is_not_found(exc):
                 raise FileNotFoundError(f"File not found: {remote}") from exc
             raise IOError(f"Failed to delete {remote}: {exc}") from exc
-    def extract_video_frame(self, video_path: str, timestamp: float = VIDEO_FRAME_TIMESTAMP) -> bytes:
+
+    def delete_files(self, paths: List[str]) -> Dict[str, Exception]:
+        """Delete each of `paths`; returns the failures by path (same shape as StorageWorkerPool.delete_files)."""
+        errors = {}
+        for path in paths:
+            try:
+                self.delete_file(path)
+            except Exception as exc:
+                errors[path] = exc
+        return errors
+
+    def extract_video_frame(self, video_path: str, timestamp: float = VIDEO_FRAME_TIMESTAMP, max_dim: Optional[int] = None) -> bytes:
         """Extract frame from video file and return as JPEG bytes.
         
         Args:
             video_path: Path to video file on WebDAV
             timestamp: Timestamp in seconds to extract frame from (default from VIDEO_FRAME_TIMESTAMP)
                       Falls back to first frame (0s) if video is shorter than requested timestamp
+            max_dim: If set, downscale the frame so its width is at most this many pixels
+                     (used when only a hash, not a preview, is needed)
             
         Returns:
             JPEG image bytes
@@ -136,23 +245,28 @@ class WebDavStorage:
         try:
             video_data = self.download_file(video_path)
             
+            # The input stays a seekable file: MP4/MOV files with the moov atom at the
+            # end cannot be demuxed from a pipe. The frame comes back on stdout.
             with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp_video:
                 tmp_video.write(video_data)
                 tmp_video_path = tmp_video.name
             
-            with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp_frame:
-                tmp_frame_path = tmp_frame.name
-            
+            scale_args = ['-vf', f"scale='min({max_dim},iw)':-2"] if max_dim else []
+
             try:
+                # -ss before -i seeks in the demuxer to the nearest keyframe instead of
+                # decoding from the start; audio/subtitle/data streams are not read.
                 cmd = [
                     'ffmpeg',
-                    '-i', tmp_video_path,
                     '-ss', str(timestamp),
+                    '-i', tmp_video_path,
+                    '-an', '-sn', '-dn',
+                    *scale_args,
                     '-vframes', '1',
-                    '-f', 'image2',
+                    '-f', 'image2pipe',
+                    '-vcodec', 'mjpeg',
                     '-q:v', str(PREVIEW_JPEG_QUALITY_VIDEO),
-                    '-y',
-                    tmp_frame_path
+                    'pipe:1'
                 ]
                 
                 result = subprocess.run(
@@ -162,18 +276,22 @@ class WebDavStorage:
                     check=False
                 )
                 
-                if result.returncode != 0:
+                # Seeking past the end succeeds but yields no frame
+                seek_past_end = result.returncode == 0 and not result.stdout
+                if result.returncode != 0 or seek_past_end:
                     error_msg = result.stderr.decode('utf-8', errors='ignore')
-                    if 'Immediate exit requested' in error_msg or 'Invalid' in error_msg:
+                    if seek_past_end or 'Immediate exit requested' in error_msg or 'Invalid' in error_msg:
                         logger.info(f"Could not extract frame at {timestamp}s (video too short?), extracting first frame instead for {video_path}")
                         cmd_fallback = [
                             'ffmpeg',
                             '-i', tmp_video_path,
+                            '-an', '-sn', '-dn',
+                            *scale_args,
                             '-vframes', '1',
-                            '-f', 'image2',
+                            '-f', 'image2pipe',
+                            '-vcodec', 'mjpeg',
                             '-q:v', str(PREVIEW_JPEG_QUALITY_VIDEO),
-                            '-y',
-                            tmp_frame_path
+                            'pipe:1'
                         ]
                         result = subprocess.run(
                             cmd_fallback,
@@ -187,8 +305,7 @@ class WebDavStorage:
                     else:
                         raise IOError(f"FFmpeg failed to extract frame: {error_msg}")
                 
-                with open(tmp_frame_path, 'rb') as f:
-                    frame_data = f.read()
+                frame_data = result.stdout
                 
                 if not frame_data:
                     raise IOError("FFmpeg produced no output")
@@ -201,10 +318,6 @@ class WebDavStorage:
                     os.unlink(tmp_video_path)
                 except Exception:
                     pass
-                try:
-                    os.unlink(tmp_frame_path)
-                except Exception:
-                    pass
                     
         except FileNotFoundError:
             raise
@@ -1,17 +1,23 @@
 import asyncio
+import datetime
+import hashlib
 import logging
+import random
 import sqlite3
-import time
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlmodel import select
 from .db_helpers import session_scope
 
-from .deduplication import calculate_phash
-from .models import Meme
+from .constants import PHASH_FRAME_MAX_DIM, PHASH_PERSIST_BATCH_SIZE, SQL_IN_CHUNK_SIZE, is_video
+from .deduplication import calculate_phash, phash_to_int
+from .models import Meme, PhashCache
 
 logger = logging.getLogger(__name__)
 _db_readonly_detected = False
+_UTC = datetime.timezone.utc
 
 
 async def call_storage(storage: Any, method_name: str, *args, **kwargs) -> Any:
@@ -33,35 +39,90 @@ async def call_storage(storage: Any, method_name: str, *args, **kwargs) -> Any:
     raise AttributeError(f"Storage has no method '{method_name}' or '{async_name}'")
 
 
+def _lookup_cached_phash(engine: Any, digest: str) -> Optional[str]:
+    """Return the phash previously computed for content `digest`, if any."""
+    try:
+        with session_scope(engine) as s:
+            row = s.get(PhashCache, digest)
+            return row.phash if row else None
+    except Exception as e:
+        logger.debug("Phash cache lookup failed for %s: %s", digest, e)
+        return None
+
+
+def lookup_cached_phashes(engine: Any, digests: List[str]) -> Dict[str, str]:
+    """Return `{sha1: phash}` for the content digests already in the phash cache."""
+    found: Dict[str, str] = {}
+    if not digests:
+        return found
+    try:
+        with session_scope(engine) as s:
+            for i in range(0, len(digests), SQL_IN_CHUNK_SIZE):
+                chunk = digests[i:i + SQL_IN_CHUNK_SIZE]
+                found.update(s.exec(select(PhashCache.sha1, PhashCache.phash).where(PhashCache.sha1.in_(chunk))).all())
+    except Exception as e:
+        logger.debug("Phash cache lookup failed for %d digests: %s", len(digests), e)
+    return found
+
+
+async def _compute_phash(filename: str, storage: Any, engine: Any, timestamp: float) -> Optional[Tuple[str, str, bool]]:
+    """Download/extract a representative image for `filename` and compute its phash.
+
+    Hashing runs in the default executor so it does not block the event loop.
+    Returns `(sha1, phash, cache_miss)`, or None if there is nothing to hash.
+    """
+    if is_video(filename):
+        try:
+            data = await call_storage(storage, 'extract_video_frame', filename, timestamp=timestamp, max_dim=PHASH_FRAME_MAX_DIM)
+            logger.debug("Extracted video frame for %s", filename)
+        except Exception as e:
+            logger.debug("Failed to extract video frame for %s: %s", filename, e)
+            return None
+    else:
+        data = await call_storage(storage, 'download_file', filename)
+
+    if not data:
+        logger.debug("Empty data for %s", filename)
+        return None
+
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    digest = hashlib.sha1(data).hexdigest()
+    phash = _lookup_cached_phash(engine, digest)
+    cache_miss = phash is None
+    if cache_miss:
+        phash = await asyncio.get_running_loop().run_in_executor(None, calculate_phash, data)
+        if not phash:
+            return None
+    else:
+        logger.debug("Reusing cached phash for %s", filename)
+    return digest, phash, cache_miss
+
+
+def _note_persist_failure(e: Exception, what: str) -> None:
+    global _db_readonly_detected
+    msg = str(e).lower()
+    if isinstance(e, sqlite3.OperationalError) or 'readonly' in msg:
+        _db_readonly_detected = True
+        logger.error("Database appears to be in read-only mode; cannot persist phash for %s. ", what)
+    else:
+        logger.exception("Failed to persist phash for %s: %s", what, e)
+
+
 async def compute_and_persist_phash(filename: str, storage: Any, engine: Any, timestamp: float = 1.0) -> Optional[str]:
     """Download/extract a representative image for `filename`, compute phash and persist it.
 
     Returns the phash string on success, or None on failure.
     """
-    global _db_readonly_detected
     if _db_readonly_detected:
         logger.debug("Skipping phash persist for %s because DB previously detected as readonly", filename)
         return None
 
     try:
-        ext = filename.lower().rsplit('.', 1)[-1] if '.' in filename else ''
-        if ext in (getattr(storage, 'VIDEO_EXTENSIONS', None) or []) or ext in ('mp4', 'mov', 'webm', 'mkv'):
-            try:
-                data = await call_storage(storage, 'extract_video_frame', filename, timestamp=timestamp)
-                logger.debug("Extracted video frame for %s", filename)
-            except Exception as e:
-                logger.debug("Failed to extract video frame for %s: %s", filename, e)
-                return None
-        else:
-            data = await call_storage(storage, 'download_file', filename)
-
-        if not data:
-            logger.debug("Empty data for %s", filename)
-            return None
-
-        phash = calculate_phash(data)
-        if not phash:
+        computed = await _compute_phash(filename, storage, engine, timestamp)
+        if computed is None:
             return None
+        digest, phash, cache_miss = computed
 
         try:
             with session_scope(engine) as s:
@@ -70,11 +131,14 @@ async def compute_and_persist_phash(filename: str, storage: Any, engine: Any, ti
                     logger.debug("No DB record for %s while persisting phash", filename)
                     return None
                 m.phash = phash
+                m.phash_bits = phash_to_int(phash)
                 try:
-                    m.updated_at = __import__('datetime').datetime.now(__import__('datetime').timezone.utc)
+                    m.updated_at = datetime.datetime.now(_UTC)
                 except Exception:
                     pass
                 s.add(m)
+                if cache_miss:
+                    s.exec(sqlite_insert(PhashCache).values(sha1=digest, phash=phash).on_conflict_do_nothing())
                 last_exc = None
                 for attempt in range(3):
                     try:
@@ -83,17 +147,72 @@ async def compute_and_persist_phash(filename: str, storage: Any, engine: Any, ti
                         return phash
                     except Exception as commit_exc:
                         last_exc = commit_exc
-                        time.sleep(0.25 * (2 ** attempt))
+                        # SQLite already waited busy_timeout for locks; back off (jittered, so concurrent
+                        # persists do not retry in lock-step) without blocking the loop
+                        if attempt < 2:
+                            await asyncio.sleep(0.25 * (2 ** attempt) * random.uniform(0.5, 1.5))
                 raise last_exc
         except Exception as e:
-            msg = str(e).lower()
-            if isinstance(e, sqlite3.OperationalError) or 'readonly' in msg:
-                _db_readonly_detected = True
-                logger.error("Database appears to be in read-only mode; cannot persist phash for %s. ", filename)
-            else:
-                logger.exception("Failed to persist phash for %s: %s", filename, e)
+            _note_persist_failure(e, filename)
             return None
 
     except Exception as e:
         logger.exception("Exception in compute_and_persist_phash for %s: %s", filename, e)
         return None
+
+
+async def compute_and_persist_phashes(
+    filenames: List[str],
+    storage: Any,
+    engine: Any,
+    timestamp: float = 1.0,
+    concurrency: int = 8,
+) -> Dict[str, Optional[str]]:
+    """Batch form of `compute_and_persist_phash`.
+
+    Up to `concurrency` files are fetched and hashed at once, and results are
+    written in one transaction per `PHASH_PERSIST_BATCH_SIZE` files instead of
+    one per file. Returns a mapping of filename to phash (None on failure).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results: Dict[str, Optional[str]] = {fn: None for fn in filenames}
+
+    async def one(filename: str) -> Optional[Tuple[str, str, bool]]:
+        async with semaphore:
+            try:
+                return await _compute_phash(filename, storage, engine, timestamp)
+            except Exception as e:
+                logger.exception("Exception in compute_and_persist_phash for %s: %s", filename, e)
+                return None
+
+    for start in range(0, len(filenames), PHASH_PERSIST_BATCH_SIZE):
+        if _db_readonly_detected:
+            logger.debug("Skipping phash persist because DB previously detected as readonly")
+            break
+        batch = filenames[start:start + PHASH_PERSIST_BATCH_SIZE]
+        computed = await asyncio.gather(*(one(fn) for fn in batch))
+        done = [(fn, c) for fn, c in zip(batch, computed) if c is not None]
+        if not done:
+            continue
+
+        now = datetime.datetime.now(_UTC)
+        try:
+            with session_scope(engine) as s:
+                persisted = []
+                for fn, (digest, phash, cache_miss) in done:
+                    res = s.exec(
+                        update(Meme).where(Meme.filename == fn)
+                        .values(phash=phash, phash_bits=phash_to_int(phash), updated_at=now)
+                    )
+                    if cache_miss:
+                        s.exec(sqlite_insert(PhashCache).values(sha1=digest, phash=phash).on_conflict_do_nothing())
+                    if res.rowcount:
+                        persisted.append((fn, phash))
+                    else:
+                        logger.debug("No DB record for %s while persisting phash", fn)
+                s.commit()
+            results.update(persisted)
+        except Exception as e:
+            _note_persist_failure(e, f"{len(done)} files")
+
+    return results
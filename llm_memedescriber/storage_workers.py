@@ -2,10 +2,10 @@ import io
 import threading
 import logging
 from concurrent.futures import ThreadPoolExecutor, Future
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import asyncio
 
-from .constants import DEFAULT_STORAGE_WORKERS
+from .constants import DEFAULT_STORAGE_WORKERS, STORAGE_BULK_CHUNK_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +25,10 @@ class StorageWorkerPool:
         self._storage = storage_adapter
         self._executor = ThreadPoolExecutor(max_workers=max_workers)
         self._max_concurrent = max_concurrent if max_concurrent is not None else max_workers
-        self._semaphore = threading.BoundedSemaphore(self._max_concurrent)
+        # The executor already caps concurrency at max_workers; the semaphore is
+        # only needed (and only paid for on every call) when the cap is tighter.
+        self._use_semaphore = self._max_concurrent < max_workers
+        self._semaphore = threading.BoundedSemaphore(self._max_concurrent) if self._use_semaphore else None
 
     def _run_guarded(self, fn: Callable, *args, **kwargs):
         self._semaphore.acquire()
@@ -43,6 +46,8 @@ class StorageWorkerPool:
         The callable `fn` should be a bound method of the underlying storage
         adapter, e.g. `self._storage.download_file`.
         """
+        if not self._use_semaphore:
+            return self._executor.submit(fn, *args, **kwargs)
         return self._executor.submit(self._run_guarded, fn, *args, **kwargs)
 
     def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs):
@@ -58,10 +63,13 @@ class StorageWorkerPool:
 
         Wraps the concurrent.futures.Future returned by `submit` using
         `asyncio.wrap_future` and awaits it. Honors optional timeout.
+        Calls that already finished by the time `submit` returns are read
+        directly, skipping the wrapper and its cross-thread callback.
         """
         fut = self.submit(fn, *args, **kwargs)
-        loop = asyncio.get_running_loop()
-        wrapped = asyncio.wrap_future(fut, loop=loop)
+        if fut.done():
+            return fut.result()
+        wrapped = asyncio.wrap_future(fut)
         if timeout is not None:
             return await asyncio.wait_for(wrapped, timeout=timeout)
         return await wrapped
@@ -91,6 +99,50 @@ class StorageWorkerPool:
     async def async_delete_file(self, *args, timeout: Optional[float] = None, **kwargs):
         return await self.async_run(self._storage.delete_file, *args, timeout=timeout, **kwargs)
 
+    @staticmethod
+    def _bulk_call(fn: Callable, paths: List[str]) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        """Call `fn(path)` for each path on one worker, collecting results and failures."""
+        results: Dict[str, Any] = {}
+        errors: Dict[str, Exception] = {}
+        for path in paths:
+            try:
+                results[path] = fn(path)
+            except Exception as exc:
+                errors[path] = exc
+        return results, errors
+
+    def _submit_chunks(self, fn: Callable, paths: List[str], chunk: int) -> List[Future]:
+        paths = list(paths)
+        return [self.submit(self._bulk_call, fn, paths[i:i + chunk]) for i in range(0, len(paths), chunk)]
+
+    @staticmethod
+    def _merge_chunks(parts) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        results: Dict[str, Any] = {}
+        errors: Dict[str, Exception] = {}
+        for chunk_results, chunk_errors in parts:
+            results.update(chunk_results)
+            errors.update(chunk_errors)
+        return results, errors
+
+    def download_files(self, paths: List[str], chunk: int = STORAGE_BULK_CHUNK_SIZE) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        """Download many files with one pool task per `chunk` paths.
+
+        Returns `(data_by_path, errors_by_path)`; a failing path does not stop the rest.
+        """
+        return self._merge_chunks(f.result() for f in self._submit_chunks(self._storage.download_file, paths, chunk))
+
+    async def async_download_files(self, paths: List[str], chunk: int = STORAGE_BULK_CHUNK_SIZE) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        futures = self._submit_chunks(self._storage.download_file, paths, chunk)
+        return self._merge_chunks(await asyncio.gather(*(asyncio.wrap_future(f) for f in futures)))
+
+    def delete_files(self, paths: List[str], chunk: int = STORAGE_BULK_CHUNK_SIZE) -> Dict[str, Exception]:
+        """Delete many files with one pool task per `chunk` paths; returns the failures by path."""
+        return self._merge_chunks(f.result() for f in self._submit_chunks(self._storage.delete_file, paths, chunk))[1]
+
+    async def async_delete_files(self, paths: List[str], chunk: int = STORAGE_BULK_CHUNK_SIZE) -> Dict[str, Exception]:
+        futures = self._submit_chunks(self._storage.delete_file, paths, chunk)
+        return self._merge_chunks(await asyncio.gather(*(asyncio.wrap_future(f) for f in futures)))[1]
+
     def extract_video_frame(self, *args, timeout: Optional[float] = None, **kwargs):
         return self.run(self._storage.extract_video_frame, *args, timeout=timeout, **kwargs)
 
@@ -1,4 +1,6 @@
 """Shared test helpers for image and DB utilities used across tests."""
+import functools
+import sqlite3
 from contextlib import contextmanager
 from pathlib import Path
 import pytest
@@ -8,10 +10,45 @@ from sqlmodel import SQLModel, create_engine, Session
 DATA_DIR = Path(__file__).parent / "data"
 
 
+_SCHEMA_TEMPLATES = {}
+
+
+def _schema_template() -> sqlite3.Connection:
+    """An in-memory DB holding the current SQLModel schema, built once per set of tables."""
+    key = frozenset(SQLModel.metadata.tables)
+    template = _SCHEMA_TEMPLATES.get(key)
+    if template is None:
+        engine = create_engine("sqlite:///:memory:", echo=False)
+        SQLModel.metadata.create_all(engine)
+        template = sqlite3.connect(":memory:", check_same_thread=False)
+        raw = engine.raw_connection()
+        try:
+            raw.driver_connection.backup(template)
+        finally:
+            raw.close()
+            engine.dispose()
+        _SCHEMA_TEMPLATES[key] = template
+    return template
+
+
+def _in_memory_engine():
+    """Fresh in-memory engine whose connections start as a copy of the schema template.
+
+    Copying a prebuilt DB with sqlite3's backup API skips running create_all per test.
+    """
+    template = _schema_template()
+
+    def _connect():
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        template.backup(conn)
+        return conn
+
+    return create_engine("sqlite://", creator=_connect, echo=False)
+
+
 @contextmanager
 def create_in_memory_session():
-    engine = create_engine("sqlite:///:memory:", echo=False)
-    SQLModel.metadata.create_all(engine)
+    engine = _in_memory_engine()
     try:
         with Session(engine) as session:
             yield session
@@ -31,8 +68,7 @@ def load_test_image_bytes(name: str) -> bytes:
 @pytest.fixture
 def in_memory_session():
     """Provide a SQLModel session backed by a fresh in-memory sqlite DB."""
-    engine = create_engine("sqlite:///:memory:", echo=False)
-    SQLModel.metadata.create_all(engine)
+    engine = _in_memory_engine()
     try:
         with Session(engine) as session:
             yield session
@@ -89,6 +125,10 @@ def caplog_set_level(caplog):
     return _set
 
 
+_MASK64 = (1 << 64) - 1
+
+
+@functools.lru_cache(maxsize=128)
 def mask_ones_val(k: int) -> int:
     if k <= 0:
         return 0
@@ -96,9 +136,10 @@ def mask_ones_val(k: int) -> int:
 
 
 def hex_from_val(val: int) -> str:
-    return f"{val & ((1 << 64) - 1):016x}"
+    return f"{val & _MASK64:016x}"
 
 
+@functools.lru_cache(maxsize=256)
 def hex_ones(k: int, shift: int = 0) -> str:
     val = mask_ones_val(k) << shift
     return hex_from_val(val)
@@ -114,6 +155,15 @@ class FakeDeleteStorage:
             raise RuntimeError("storage failure")
         self.deleted.append(name)
 
+    def delete_files(self, paths):
+        errors = {}
+        for name in paths:
+            try:
+                self.delete_file(name)
+            except Exception as e:
+                errors[name] = e
+        return errors
+
 class FakeStorage:
     def __init__(self, content: bytes = None):
         self.content = content
@@ -124,7 +174,7 @@ class FakeStorage:
         self.download_calls += 1
         return self.content
 
-    def extract_video_frame(self, filename, timestamp=1.0):
+    def extract_video_frame(self, filename, timestamp=1.0, max_dim=None):
         self.extract_calls += 1
         return self.content
 
@@ -2,40 +2,47 @@ import os
 import sys
 
 from pathlib import Path
-from PIL import Image
-
-from _helpers import *
 
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
+# Same module name the test files use, so fixtures and helpers exist once (one FakeStorage class)
+from tests._helpers import *
+
+_TEST_IMAGE_NAMES = frozenset({
+    "rgb.png", "rgb_variant2.png", "grayscale.png", "paletted.png", "rgba.png",
+    "rgb.jpg", "rgb.jpeg", "rgb.gif", "rgb_large.webp",
+})
+
+
 def _ensure_test_images():
     data_dir = Path(__file__).parent / "data"
     data_dir.mkdir(exist_ok=True)
 
+    # One directory read instead of a stat per image; PIL is only imported when something is missing
+    with os.scandir(data_dir) as it:
+        if _TEST_IMAGE_NAMES <= {entry.name for entry in it}:
+            return
+
+    from PIL import Image
+
     rgb_path = data_dir / "rgb.png"
     if not rgb_path.exists():
         img = Image.new("RGB", (64, 64), (128, 128, 128))
-        for x in range(10, 30):
-            for y in range(10, 30):
-                img.putpixel((x, y), (200, 50, 50))
+        img.paste((200, 50, 50), (10, 10, 30, 30))
         img.save(rgb_path, format="PNG")
 
     var2_path = data_dir / "rgb_variant2.png"
     if not var2_path.exists():
         img = Image.new("RGB", (64, 64), (128, 128, 128))
-        for x in range(2, 22):
-            for y in range(2, 22):
-                img.putpixel((x, y), (50, 200, 50))
+        img.paste((50, 200, 50), (2, 2, 22, 22))
         img.save(var2_path, format="PNG")
 
     gray_path = data_dir / "grayscale.png"
     if not gray_path.exists():
         img = Image.new("L", (64, 64), 128)
-        for x in range(10, 30):
-            for y in range(10, 30):
-                img.putpixel((x, y), 200)
+        img.paste(200, (10, 10, 30, 30))
         img.save(gray_path, format="PNG")
 
     pal_path = data_dir / "paletted.png"
@@ -47,9 +54,7 @@ def _ensure_test_images():
     rgba_path = data_dir / "rgba.png"
     if not rgba_path.exists():
         img = Image.new("RGBA", (64, 64), (128, 128, 128, 255))
-        for x in range(10, 30):
-            for y in range(10, 30):
-                img.putpixel((x, y), (200, 50, 50, 128))
+        img.paste((200, 50, 50, 128), (10, 10, 30, 30))
         img.save(rgba_path, format="PNG")
 
     try:
@@ -74,9 +79,7 @@ def _ensure_test_images():
         webp_large = data_dir / "rgb_large.webp"
         if not webp_large.exists():
             img_large = Image.new("RGB", (1024, 1024), (128, 128, 128))
-            for x in range(80, 200):
-                for y in range(80, 200):
-                    img_large.putpixel((x, y), (200, 50, 50))
+            img_large.paste((200, 50, 50), (80, 80, 200, 200))
             img_large.save(webp_large, format="WEBP", lossless=True, quality=100)
     except Exception:
         pass
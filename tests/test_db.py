@@ -113,3 +113,80 @@ def test_init_db_handles_os_path_exists_exception(monkeypatch, tmp_path):
     eng = dbmod.init_db(f"sqlite:///{db_file}")
     assert eng is not None
     eng.dispose()
+
+
+def test_init_db_adds_missing_columns_and_backfills_phash_bits(tmp_path):
+    import sqlite3
+    db_file = tmp_path / 'old.db'
+    conn = sqlite3.connect(db_file)
+    conn.execute(
+        "CREATE TABLE meme (id INTEGER PRIMARY KEY, filename VARCHAR NOT NULL UNIQUE, category VARCHAR, "
+        "description VARCHAR, keywords VARCHAR, text_in_image VARCHAR, source_url VARCHAR, status VARCHAR NOT NULL, "
+        "attempts INTEGER NOT NULL, last_error VARCHAR, last_attempt_at DATETIME, created_at DATETIME NOT NULL, "
+        "updated_at DATETIME NOT NULL, phash VARCHAR, is_false_positive BOOLEAN NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO meme (filename, status, attempts, created_at, updated_at, phash, is_false_positive) "
+        "VALUES ('old.png', 'filled', 0, '2024-01-01', '2024-01-01', 'ffffffffffffffff', 0)"
+    )
+    conn.commit()
+    conn.close()
+
+    eng = init_db(f"sqlite:///{db_file}")
+    with Session(eng) as s:
+        m = get_meme_by_filename(s, 'old.png')
+        assert m.phash_bits == -1
+    with eng.connect() as c:
+        indexes = {row[1] for row in c.exec_driver_sql("PRAGMA index_list('meme')")}
+    assert 'ix_meme_status_id' in indexes
+    eng.dispose()
+
+
+def test_init_db_applies_pragmas_to_every_connection(tmp_path):
+    eng = init_db(f"sqlite:///{tmp_path/'p.db'}")
+    try:
+        with eng.connect() as c1, eng.connect() as c2:
+            for conn in (c1, c2):
+                assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+                assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == 'wal'
+    finally:
+        eng.dispose()
+
+
+def test_init_db_registers_hamming_function(tmp_path):
+    eng = init_db(f"sqlite:///{tmp_path/'h.db'}")
+    try:
+        with eng.connect() as c:
+            assert c.exec_driver_sql("SELECT hamming(-1, 0)").scalar() == 64
+            assert c.exec_driver_sql("SELECT hamming(5, 3)").scalar() == 2
+            assert c.exec_driver_sql("SELECT hamming(NULL, 3)").scalar() is None
+    finally:
+        eng.dispose()
+
+
+def test_init_db_canonicalizes_duplicate_pairs(tmp_path):
+    import sqlite3
+    from llm_memedescriber.models import Duplicate
+    from sqlmodel import select
+    db_file = tmp_path / 'dups.db'
+    conn = sqlite3.connect(db_file)
+    conn.execute(
+        "CREATE TABLE duplicate (id INTEGER PRIMARY KEY, filename_a VARCHAR NOT NULL, filename_b VARCHAR NOT NULL, "
+        "is_false_positive BOOLEAN NOT NULL, created_at DATETIME NOT NULL)"
+    )
+    conn.executemany(
+        "INSERT INTO duplicate (filename_a, filename_b, is_false_positive, created_at) VALUES (?, ?, ?, '2024-01-01')",
+        [('b.png', 'a.png', 0), ('a.png', 'b.png', 1), ('c.png', 'd.png', 0)],
+    )
+    conn.commit()
+    conn.close()
+
+    eng = init_db(f"sqlite:///{db_file}")
+    with Session(eng) as s:
+        rows = sorted((d.id, d.filename_a, d.filename_b, d.is_false_positive) for d in s.exec(select(Duplicate)))
+    with eng.connect() as c:
+        indexes = {row[1] for row in c.exec_driver_sql("PRAGMA index_list('duplicate')")}
+    eng.dispose()
+
+    assert rows == [(1, 'a.png', 'b.png', True), (3, 'c.png', 'd.png', False)]
+    assert 'uq_duplicate_pair' in indexes
@@ -14,7 +14,9 @@ from sqlmodel import SQLModel, create_engine, Session, select
 
 from llm_memedescriber.deduplication import (
     calculate_phash,
+    calculate_phash_batch,
     hamming_distance,
+    phash_to_int,
     find_duplicate_groups,
     mark_false_positive,
     merge_duplicates,
@@ -77,6 +79,33 @@ def test_calculate_phash_differs_for_different_images(load_test_image):
     assert phash1 != phash2
 
 
+def test_calculate_phash_large_jpeg_draft_matches_full_decode(load_test_image):
+    from io import BytesIO
+    from PIL import Image
+    import imagehash
+
+    img = Image.open(BytesIO(load_test_image("rgb_large.webp"))).convert("RGB")
+    with BytesIO() as bio:
+        img.save(bio, format="JPEG", quality=90)
+        data = bio.getvalue()
+
+    phash = calculate_phash(data)
+    assert phash is not None and len(phash) == 16
+
+    full = str(imagehash.phash(Image.open(BytesIO(data)).convert("RGB")))
+    assert hamming_distance(phash, full) <= 2
+
+
+def test_calculate_phash_batch_matches_single_image_hashes(load_test_image):
+    datas = [load_test_image(f) for f in sorted(os.listdir(DATA_DIR))]
+    datas.append(b"")
+
+    batch = calculate_phash_batch(datas)
+
+    assert batch == [calculate_phash(d) for d in datas]
+    assert batch[-1] is None
+
+
 def test_calculate_phash_handles_grayscale_image(load_test_image):
     data = load_test_image("grayscale.png")
     phash = calculate_phash(data)
@@ -154,6 +183,43 @@ def test_hamming_distance_not_str():
     assert d == 999
 
 
+def test_phash_to_int_fits_signed_64_bit():
+    assert phash_to_int("0000000000000001") == 1
+    assert phash_to_int("7fffffffffffffff") == (1 << 63) - 1
+    assert phash_to_int("ffffffffffffffff") == -1
+    assert phash_to_int("8000000000000000") == -(1 << 63)
+    assert phash_to_int("abcd") is None
+    assert phash_to_int("zzzzzzzzzzzzzzzz") is None
+    assert phash_to_int(None) is None
+
+
+def test_find_duplicate_groups_prefers_phash_bits(in_memory_session):
+    session = in_memory_session
+    a = Meme(filename="bits_a.png", phash=hex_ones(64), phash_bits=phash_to_int(hex_ones(64)))
+    b = Meme(filename="bits_b.png", phash=hex_ones(63), phash_bits=phash_to_int(hex_ones(63)))
+    # stale hex is ignored when the integer column is populated
+    c = Meme(filename="bits_c.png", phash=hex_ones(64), phash_bits=0)
+    session.add_all([a, b, c])
+    session.commit()
+
+    groups = find_duplicate_groups(session)
+    groups_sets = [set(m.filename for m in g) for g in groups]
+    assert groups_sets == [{"bits_a.png", "bits_b.png"}]
+
+
+def test_find_duplicate_groups_skips_removed_memes(in_memory_session):
+    session = in_memory_session
+    session.add_all([
+        Meme(filename="live_a.png", phash=hex_ones(0)),
+        Meme(filename="live_b.png", phash=hex_ones(0)),
+        Meme(filename="gone.png", phash=hex_ones(0), status="removed"),
+    ])
+    session.commit()
+
+    groups = find_duplicate_groups(session)
+    assert [set(m.filename for m in g) for g in groups] == [{"live_a.png", "live_b.png"}]
+
+
 def test_find_duplicate_groups_detects_similar_memes(in_memory_session):
     T = DUPLICATE_THRESHOLD
     small_k = 1 if T >= 1 else 0
@@ -449,6 +515,26 @@ def test_merge_duplicates_storage_delete_exception_is_logged(caplog_set_level, c
     assert any('Failed to delete bad.png' in r.getMessage() for r in caplog.records)
 
 
+def test_merge_duplicates_deletes_files_in_one_bulk_call(in_memory_session):
+    session = in_memory_session
+    session.add_all([Meme(filename="bp.png", phash=hex_ones(0)), Meme(filename="bd1.png", phash=hex_ones(0)), Meme(filename="bd2.png", phash=hex_ones(0))])
+    session.commit()
+
+    class BulkStorage(FakeDeleteStorage):
+        def __init__(self):
+            super().__init__()
+            self.bulk_calls = []
+
+        def delete_files(self, paths):
+            self.bulk_calls.append(list(paths))
+            return {}
+
+    storage = BulkStorage()
+    assert merge_duplicates(session, storage, "bp.png", ["bd1.png", "bd2.png"]) is True
+    assert storage.bulk_calls == [["bd1.png", "bd2.png"]]
+    assert session.exec(select(Meme).where(Meme.filename.in_(["bd1.png", "bd2.png"]))).all() == []
+
+
 def test_merge_duplicates_cleans_up_groups(in_memory_session):
     session = in_memory_session
     g = DuplicateGroup()
@@ -557,4 +643,11 @@ def test_remove_pair_exception_deletes_and_returns_true_order_insensitive():
         res = remove_pair_exception(session, "r2.png", "r1.png")
         assert res is True
         remaining = session.exec(select(Duplicate).where((Duplicate.filename_a == "r1.png") | (Duplicate.filename_b == "r1.png"))).all()
-        assert remaining == []
\ No newline at end of file
+        assert remaining == []
+
+def test_add_pair_exception_stores_pair_in_canonical_order(in_memory_session):
+    session = in_memory_session
+    dup = add_pair_exception(session, "z.png", "m.png")
+    assert (dup.filename_a, dup.filename_b) == ("m.png", "z.png")
+    assert add_pair_exception(session, "m.png", "z.png").id == dup.id
+    assert len(session.exec(select(Duplicate)).all()) == 1
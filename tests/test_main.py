@@ -0,0 +1,276 @@
+import builtins
+import importlib
+import sys
+from types import SimpleNamespace
+
+import pytest
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from llm_memedescriber.models import Meme
+
+from tests._helpers import make_fake_open
+
+
+@pytest.fixture(scope="module")
+def main_module():
+    """Import llm_memedescriber.main without the container's /app/PROMPT.txt."""
+    real_open = builtins.open
+    builtins.open = make_fake_open("/app/PROMPT.txt", "Describe this meme.")
+    try:
+        sys.modules.pop("llm_memedescriber.main", None)
+        return importlib.import_module("llm_memedescriber.main")
+    finally:
+        builtins.open = real_open
+
+
+class ListingStorage:
+    def __init__(self, entries):
+        self.entries = entries
+        self.downloads = []
+
+    def list_files(self, path, recursive=False):
+        return list(self.entries)
+
+    def download_file(self, name, size_hint=None):
+        self.downloads.append(name)
+        return b""
+
+
+def _entry(name, **extra):
+    return {'path': '/' + name, 'name': name, 'is_dir': False, **extra}
+
+
+@pytest.fixture
+def make_app(main_module, tmp_path, monkeypatch):
+    monkeypatch.setattr(main_module, "cleanup_orphaned_cache", lambda names: 0)
+    engine = create_engine(f"sqlite:///{tmp_path / 'memes.db'}")
+    SQLModel.metadata.create_all(engine)
+    apps = []
+
+    def _make(storage, **settings):
+        opts = dict(webdav_url="http://dav", webdav_path="/memes", storage_concurrency=2,
+                    sync_max_records=None, max_upload_bytes=1000)
+        opts.update(settings)
+        app = main_module.App(SimpleNamespace(**opts), storage, genai_client=object(), engine=engine)
+        app.generation_requests = []
+
+        def fake_process(name):
+            app.generation_requests.append(name)
+            return {'failed': True}
+
+        app._process_single_meme = fake_process
+        apps.append(app)
+        return app
+
+    yield _make, engine
+    for app in apps:
+        app.stop()
+    engine.dispose()
+
+
+def _statuses(engine):
+    with Session(engine) as s:
+        return dict(s.exec(select(Meme.filename, Meme.status)).all())
+
+
+def test_sync_restores_memes_that_disappear_and_reappear(make_app):
+    make, engine = make_app
+    storage = ListingStorage([_entry("a.jpg"), _entry("b.jpg")])
+    app = make(storage)
+
+    app.sync_and_process()
+    with Session(engine) as s:
+        a = s.exec(select(Meme).where(Meme.filename == "a.jpg")).one()
+        a.status = "filled"
+        a.description = "a cat"
+        s.add(a)
+        s.commit()
+
+    # b.jpg briefly missing from the listing
+    storage.entries = [_entry("a.jpg")]
+    assert app.sync_and_process()['removed'] == 1
+    assert _statuses(engine) == {"a.jpg": "filled", "b.jpg": "removed"}
+
+    # a.jpg missing while b.jpg is back: b returns to pending, a is removed
+    storage.entries = [_entry("b.jpg")]
+    app.sync_and_process()
+    assert _statuses(engine) == {"a.jpg": "removed", "b.jpg": "pending"}
+
+    # a.jpg back with its description: filled again and not sent for generation
+    storage.entries = [_entry("a.jpg"), _entry("b.jpg")]
+    app.generation_requests.clear()
+    app.sync_and_process()
+    assert _statuses(engine) == {"a.jpg": "filled", "b.jpg": "pending"}
+    assert app.generation_requests == ["b.jpg"]
+
+
+def test_sync_does_not_mass_remove_on_empty_listing(make_app):
+    make, engine = make_app
+    storage = ListingStorage([_entry("a.jpg"), _entry("b.jpg")])
+    app = make(storage)
+    app.sync_and_process()
+
+    storage.entries = []
+    assert app.sync_and_process()['removed'] == 0
+    assert set(_statuses(engine).values()) == {"pending"}
+
+
+def test_oversize_file_from_listing_is_marked_without_download(make_app):
+    from llm_memedescriber.storage import WebDavStorage
+    from tests._helpers import FakeClient
+
+    class RecordingStorage(WebDavStorage):
+        downloads = []
+
+        def download_file(self, path, size_hint=None):
+            self.downloads.append(path)
+            return b""
+
+    storage = RecordingStorage('http://example')
+    storage.client = FakeClient({'/': [
+        {'name': 'big.jpg', 'href': '/big.jpg', 'content_length': 5000, 'type': 'file', 'modified': None},
+    ]})
+    make, engine = make_app
+    app = make(storage, max_upload_bytes=1000)
+
+    app.sync_and_process()
+    assert app._listing_sizes == {'big.jpg': 5000}
+    storage.downloads.clear()  # the sync's phash pass downloads new images
+
+    assert app.generate_description('big.jpg') == {}
+    assert _statuses(engine) == {'big.jpg': 'oversize'}
+    assert storage.downloads == []
+
+
+def test_new_phashes_are_computed_in_chunks_and_reuse_the_content_cache(make_app, main_module, monkeypatch):
+    from llm_memedescriber.models import PhashCache
+    from tests._helpers import load_test_image_bytes
+
+    contents = {
+        'a.png': load_test_image_bytes('rgb.png'),
+        'b.png': load_test_image_bytes('rgb.png'),  # same content as a.png
+        'c.png': load_test_image_bytes('rgb_variant2.png'),
+    }
+
+    class ImageStorage(ListingStorage):
+        def download_file(self, name, size_hint=None):
+            self.downloads.append(name)
+            return contents[name]
+
+    make, engine = make_app
+    app = make(ImageStorage([_entry(n) for n in contents]))
+
+    download_chunks = []
+    real_download_many = app._download_many
+
+    async def recording_download_many(names):
+        download_chunks.append(list(names))
+        return await real_download_many(names)
+
+    hashed = []
+    real_batch = main_module.calculate_phash_batch
+
+    def recording_batch(datas):
+        if datas:
+            hashed.append(len(datas))
+        return real_batch(datas)
+
+    monkeypatch.setattr(app, '_download_many', recording_download_many)
+    monkeypatch.setattr(main_module, 'calculate_phash_batch', recording_batch)
+    monkeypatch.setattr(main_module, 'PHASH_DOWNLOAD_CHUNK_SIZE', 1)
+
+    app.sync_and_process()
+
+    assert download_chunks == [['a.png'], ['b.png'], ['c.png']]
+    assert hashed == [1, 1]  # b.png reused a.png's cached hash
+    with Session(engine) as s:
+        phashes = dict(s.exec(select(Meme.filename, Meme.phash)).all())
+        assert len(s.exec(select(PhashCache)).all()) == 2
+    assert phashes['a.png'] and phashes['a.png'] == phashes['b.png']
+    assert phashes['c.png']
+
+
+def test_listing_upsert_fits_the_legacy_sqlite_variable_limit(make_app):
+    import sqlite3
+    from sqlalchemy import event
+
+    make, engine = make_app
+
+    @event.listens_for(engine, "connect")
+    def _legacy_limit(dbapi_conn, _):
+        dbapi_conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+
+    engine.dispose()
+    names = [f"m{i:04d}.jpg" for i in range(400)]
+    app = make(ListingStorage([_entry(n) for n in names]))
+
+    assert app.sync_and_process()['added'] == 400
+    assert len(_statuses(engine)) == 400
+
+
+def test_duplicate_groups_are_rebuilt_when_a_removed_meme_is_listed_again(make_app):
+    from llm_memedescriber.models import MemeDuplicateGroup
+    from tests._helpers import load_test_image_bytes
+
+    data = load_test_image_bytes('rgb.png')
+
+    class ImageStorage(ListingStorage):
+        def download_file(self, name, size_hint=None):
+            self.downloads.append(name)
+            return data
+
+    def grouped(engine):
+        with Session(engine) as s:
+            return sorted(s.exec(select(MemeDuplicateGroup.filename)).all())
+
+    make, engine = make_app
+    storage = ImageStorage([_entry("a.png"), _entry("b.png")])
+    app = make(storage)
+
+    app.sync_and_process()
+    assert grouped(engine) == ["a.png", "b.png"]
+
+    storage.entries = [_entry("a.png")]
+    app.sync_and_process()
+    assert grouped(engine) == []
+
+    # b.png keeps its stored phash, so nothing is hashed on the way back
+    storage.entries = [_entry("a.png"), _entry("b.png")]
+    storage.downloads.clear()
+    app.sync_and_process()
+    assert storage.downloads == []
+    assert grouped(engine) == ["a.png", "b.png"]
+
+
+def test_db_writer_fails_saves_still_queued_when_it_stops(make_app):
+    import queue
+    from concurrent.futures import Future
+
+    class LateQueue(queue.Queue):
+        def get(self, block=True, timeout=None):
+            # The save lands just after the writer's last blocking get() timed out
+            if block:
+                raise queue.Empty
+            return super().get(block=False)
+
+    make, _ = make_app
+    app = make(ListingStorage([]))
+    app._save_queue = LateQueue()
+    futures = [Future(), Future()]
+    for i, fut in enumerate(futures):
+        app._save_queue.put((f"late{i}.jpg", {"description": "x"}, fut))
+    app.stop_event.set()
+
+    app._db_writer()
+    assert [f.result(timeout=0) for f in futures] == [False, False]
+    assert app._save_queue.empty()
+
+
+def test_save_description_gives_up_when_no_writer_answers(make_app, main_module, monkeypatch):
+    make, _ = make_app
+    app = make(ListingStorage([]))
+    monkeypatch.setattr(main_module, "DB_SAVE_TIMEOUT_SECONDS", 0.05)
+    # The writer was seen alive but exits before taking this save
+    monkeypatch.setattr(app, "_ensure_db_writer", lambda: None)
+
+    assert app._save_description("orphan.jpg", {"description": "x"}) is False
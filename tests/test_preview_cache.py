@@ -278,7 +278,7 @@ def test_cleanup_orphaned_cache(tmp_path):
     # Create cache files for both valid and orphaned files
     import hashlib
     for filename in valid_filenames | orphaned_filenames:
-        name_hash = hashlib.md5(filename.encode()).hexdigest()
+        name_hash = hashlib.blake2b(filename.encode(), digest_size=16).hexdigest()
         cache_file = cache_dir / f"{name_hash}.jpg"
         cache_file.write_bytes(b"fake image data")
     
@@ -294,12 +294,12 @@ def test_cleanup_orphaned_cache(tmp_path):
     
     # Verify that valid files still exist
     for filename in valid_filenames:
-        name_hash = hashlib.md5(filename.encode()).hexdigest()
+        name_hash = hashlib.blake2b(filename.encode(), digest_size=16).hexdigest()
         assert (cache_dir / f"{name_hash}.jpg").exists()
     
     # Verify that orphaned files were removed
     for filename in orphaned_filenames:
-        name_hash = hashlib.md5(filename.encode()).hexdigest()
+        name_hash = hashlib.blake2b(filename.encode(), digest_size=16).hexdigest()
         assert not (cache_dir / f"{name_hash}.jpg").exists()
 
 
@@ -346,3 +346,26 @@ def test_cleanup_orphaned_cache_with_non_jpg_files(tmp_path):
     assert (cache_dir / "other_file.txt").exists()
     assert (cache_dir / "cache_manifest.json").exists()
     assert len(list(cache_dir.glob("*.jpg"))) == 0
+
+
+def test_cleanup_orphaned_cache_migrates_legacy_md5_names(tmp_path, monkeypatch):
+    """The first cleanup renames MD5-keyed previews instead of deleting them."""
+    import hashlib
+
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    preview_helpers.CACHE_DIR = str(cache_dir)
+    monkeypatch.setattr(preview_helpers, '_LEGACY_NAMES_MIGRATED', False)
+
+    def md5_name(f):
+        return hashlib.md5(f.encode()).hexdigest() + '.jpg'
+
+    (cache_dir / md5_name("kept.jpg")).write_bytes(b"old preview")
+    (cache_dir / md5_name("gone.jpg")).write_bytes(b"orphan")
+
+    removed_count = preview_helpers.cleanup_orphaned_cache({"kept.jpg"})
+
+    assert removed_count == 1
+    assert [p.name for p in cache_dir.glob("*.jpg")] == [preview_helpers._cache_name("kept.jpg")]
+    assert (cache_dir / preview_helpers._cache_name("kept.jpg")).read_bytes() == b"old preview"
+    assert preview_helpers._LEGACY_NAMES_MIGRATED
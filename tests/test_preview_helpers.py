@@ -93,6 +93,25 @@ def test_async_generate_preview_uses_call_storage(tmp_path):
     assert storage.download_calls == 1
 
 
+def test_async_generate_preview_encodes_in_the_process_pool(tmp_path, monkeypatch):
+    preview_helpers.CACHE_DIR = str(tmp_path / "cache_pool")
+    monkeypatch.setattr(preview_helpers, 'PREVIEW_POOL_MAX_WORKERS', 1)
+    preview_helpers.shutdown_preview_pool()
+    storage = FakeStorage(content=make_png_bytes(mode='RGBA', size=(640, 320)))
+
+    try:
+        out = asyncio.run(preview_helpers.async_generate_preview('pool.png', is_vid=False, storage=storage, size=100))
+        pool = preview_helpers._PREVIEW_POOL
+        assert pool is not None and pool._max_workers == 1
+    finally:
+        preview_helpers.shutdown_preview_pool()
+
+    assert preview_helpers._PREVIEW_POOL is None
+    with Image.open(BytesIO(out)) as img:
+        assert img.format == 'JPEG' and img.mode == 'RGB'
+        assert img.size == (100, 50)
+
+
 def test_async_generate_preview_prefers_async_method(tmp_path):
     preview_helpers.CACHE_DIR = str(tmp_path / "cache_async2")
     data = make_png_bytes(mode='RGB')
@@ -175,11 +194,11 @@ def test_async_generate_preview_logs_and_raises_on_unexpected_exception(tmp_path
     assert any('Failed to generate preview for' in r.getMessage() for r in caplog.records)
 
 
-def test_cache_path_md5(tmp_path):
-    preview_helpers.CACHE_DIR = str(tmp_path / "cache_md5")
+def test_cache_path_blake2b(tmp_path):
+    preview_helpers.CACHE_DIR = str(tmp_path / "cache_blake2b")
     import hashlib
     name = 'somefile.png'
-    expected = hashlib.md5(name.encode()).hexdigest()
+    expected = hashlib.blake2b(name.encode(), digest_size=16).hexdigest()
     path = preview_helpers._cache_path(name)
     assert path.endswith(expected + '.jpg')
 
@@ -432,3 +451,55 @@ def test_async_generate_preview_uses_cache(tmp_path):
     out2 = asyncio.run(preview_helpers.async_generate_preview('x.png', is_vid=False, storage=storage2))
     assert out2 == out1
     assert storage2.download_calls == 0
+
+
+def test_encode_preview_returns_small_jpeg_unchanged():
+    img = Image.new('RGB', (40, 30), (200, 10, 10))
+    with BytesIO() as bio:
+        img.save(bio, format='JPEG', quality=90)
+        data = bio.getvalue()
+
+    assert preview_helpers._encode_preview(data, 300) == data
+
+
+def test_encode_preview_downscales_large_jpeg():
+    img = Image.new('RGB', (1200, 800), (200, 10, 10))
+    with BytesIO() as bio:
+        img.save(bio, format='JPEG', quality=90)
+        data = bio.getvalue()
+
+    out = Image.open(BytesIO(preview_helpers._encode_preview(data, 300)))
+    assert out.format == 'JPEG'
+    assert out.size == (300, 200)
+
+
+def test_generate_preview_serves_repeat_requests_from_memory(tmp_path):
+    preview_helpers.CACHE_DIR = str(tmp_path / "cache_mem")
+    storage = FakeStorage(content=make_png_bytes())
+
+    out = preview_helpers.generate_preview('mem.png', is_vid=False, storage=storage, size=32)
+    cache_path = preview_helpers._cache_path('mem.png')
+    os.remove(cache_path)
+
+    # disk copy is gone, but the in-memory entry still answers
+    assert preview_helpers.generate_preview('mem.png', is_vid=False, storage=storage, size=32) == out
+    assert storage.download_calls == 1
+
+    preview_helpers.remove_cache_entry('mem.png')
+    preview_helpers.generate_preview('mem.png', is_vid=False, storage=storage, size=32)
+    assert storage.download_calls == 2
+
+
+def test_prefetch_previews_warms_cache_and_skips_failures(tmp_path):
+    preview_helpers.CACHE_DIR = str(tmp_path / "cache_prefetch")
+    storage = AsyncFakeStorage(content=make_png_bytes())
+    names = [f'p{i}.png' for i in range(5)]
+
+    warmed = asyncio.run(preview_helpers.prefetch_previews(names, {}, storage, size=32, radius=3))
+    assert warmed == 3
+    assert storage.download_calls == 3
+    assert all(os.path.exists(preview_helpers._cache_path(n)) for n in names[:3])
+    assert not os.path.exists(preview_helpers._cache_path(names[3]))
+
+    missing = AsyncFakeStorage(content=None)
+    assert asyncio.run(preview_helpers.prefetch_previews(['gone.png'], {}, missing)) == 0
@@ -1,5 +1,7 @@
 import os
 import shutil
+import threading
+import time
 from whoosh.filedb.filestore import FileStorage
 
 import pytest
@@ -28,7 +30,11 @@ def ensure_filestorage_has_has_index(monkeypatch):
         def open_index(self):
             return self._fs.open_index()
     monkeypatch.setattr(search, 'FileStorage', FSWrapper)
+    search._open_index.cache_clear()
+    search._query_parser.cache_clear()
     yield
+    search.close_index_writer()
+    search._open_index.cache_clear()
 
 
 def test_get_schema_has_expected_fields():
@@ -175,7 +181,7 @@ def test_rebuild_index_writer_cancel_on_exception(monkeypatch, caplog):
             self.cancel_called = True
 
     class FakeIndex:
-        def writer(self):
+        def writer(self, **kwargs):
             w = FakeWriter()
             called['writer'] = w
             return w
@@ -288,3 +294,130 @@ def test_search_memes_handles_non_int_id(monkeypatch, tmp_path, caplog):
     res = search.search_memes('anything')
     assert res == []
     assert any('Search failed' in r.message for r in caplog.records)
+
+
+def test_add_meme_to_index_buffers_until_writer_closed(tmp_path, monkeypatch):
+    idx = tmp_path / 'whooshidx'
+    monkeypatch.setattr(search, 'INDEX_DIR', str(idx))
+    monkeypatch.setattr(search, 'INDEX_WRITER_FLUSH_SECONDS', 3600)
+    search.init_index()
+
+    search.add_meme_to_index(Meme(id=77, filename='buf.png', description='buffered', status='filled'))
+    assert any(r['filename'] == 'buf.png' for r in search.search_memes('buffered'))
+    with FileStorage(str(idx)).open_index().searcher() as s:
+        assert s.doc_count() == 0
+
+    search.close_index_writer()
+    with FileStorage(str(idx)).open_index().searcher() as s:
+        assert s.doc_count() == 1
+
+
+def test_buffered_changes_are_flushed_without_a_further_write(tmp_path, monkeypatch):
+    idx = tmp_path / 'whooshidx'
+    monkeypatch.setattr(search, 'INDEX_DIR', str(idx))
+    monkeypatch.setattr(search, 'INDEX_WRITER_FLUSH_SECONDS', 0.1)
+    search.init_index()
+
+    search.add_meme_to_index(Meme(id=78, filename='last.png', description='last edit', status='filled'))
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        with FileStorage(str(idx)).open_index().searcher() as s:
+            if s.doc_count() == 1:
+                break
+        time.sleep(0.05)
+    with FileStorage(str(idx)).open_index().searcher() as s:
+        assert s.doc_count() == 1
+
+
+def test_rebuild_index_blocks_concurrent_writes_until_done(tmp_path, monkeypatch):
+    idx = tmp_path / 'whooshidx'
+    monkeypatch.setattr(search, 'INDEX_DIR', str(idx))
+    search.init_index()
+    real_rmtree = shutil.rmtree
+    adder = threading.Thread(target=search.add_meme_to_index,
+                             args=(Meme(id=2, filename='late.png', description='late', status='filled'),))
+
+    def rmtree_with_concurrent_add(path):
+        adder.start()
+        adder.join(timeout=0.2)
+        assert adder.is_alive()  # waiting on the writer lock
+        real_rmtree(path)
+
+    monkeypatch.setattr(shutil, 'rmtree', rmtree_with_concurrent_add)
+    with create_in_memory_session() as sess:
+        sess.add(Meme(id=1, filename='old.png', description='rebuilt', status='filled'))
+        sess.commit()
+        search.rebuild_index(sess.get_bind())
+    adder.join(timeout=5)
+    assert not adder.is_alive()
+
+    search.close_index_writer()
+    with FileStorage(str(idx)).open_index().searcher() as s:
+        assert sorted(f['filename'] for f in s.all_stored_fields()) == ['late.png', 'old.png']
+
+
+def test_search_memes_reads_through_the_shared_writer(tmp_path, monkeypatch):
+    idx = tmp_path / 'whooshidx'
+    monkeypatch.setattr(search, 'INDEX_DIR', str(idx))
+    monkeypatch.setattr(search, 'INDEX_WRITER_FLUSH_SECONDS', 3600)
+    search.init_index()
+    w = FileStorage(str(idx)).open_index().writer()
+    w.add_document(id='1', filename='one.png', description='shared words', status='filled', processed='true')
+    w.commit()
+
+    assert len(search.search_memes('shared')) == 1
+    assert search._WRITER is not None
+
+    search.add_meme_to_index(Meme(id=2, filename='two.png', description='shared too', status='filled'))
+    assert sorted(r['filename'] for r in search.search_memes('shared')) == ['one.png', 'two.png']
+
+
+def test_search_memes_runs_concurrently(tmp_path, monkeypatch):
+    import threading
+    from whoosh.searching import Searcher
+
+    idx = tmp_path / 'whooshidx'
+    monkeypatch.setattr(search, 'INDEX_DIR', str(idx))
+    search.init_index()
+    w = FileStorage(str(idx)).open_index().writer()
+    w.add_document(id='1', filename='one.png', description='shared words', status='filled', processed='true')
+    w.commit()
+    search.search_memes('shared')  # open the shared writer
+
+    # Each search waits for the other to be inside Searcher.search too
+    barrier = threading.Barrier(2, timeout=5)
+    real_search = Searcher.search
+
+    def rendezvous_search(self, *args, **kwargs):
+        barrier.wait()
+        return real_search(self, *args, **kwargs)
+
+    monkeypatch.setattr(Searcher, 'search', rendezvous_search)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(search.search_memes('shared'))) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+
+    assert [len(r) for r in results] == [1, 1]
+
+
+def test_search_memes_fills_text_fields_from_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(search, 'INDEX_DIR', str(tmp_path / 'whooshidx'))
+
+    with create_in_memory_session() as sess:
+        sess.add(Meme(filename='db.png', description='hydrated text', keywords='kw', status='filled'))
+        sess.commit()
+        eng = sess.get_bind()
+        search.rebuild_index(eng)
+
+        bare = search.search_memes('hydrated')
+        assert [r['filename'] for r in bare] == ['db.png']
+        assert bare[0]['description'] == ''
+
+        res = search.search_memes('hydrated', engine=eng)
+        assert res[0]['description'] == 'hydrated text'
+        assert res[0]['keywords'] == 'kw'
+        assert res[0]['processed'] is True
@@ -42,6 +42,25 @@ def test_list_files_handles_dicts_and_strings_and_metadata():
     assert names['relative.txt']['path'] == '/root/relative.txt'
 
 
+def test_list_files_maps_webdav4_detail_keys():
+    import datetime
+    modified = datetime.datetime(2024, 5, 1, tzinfo=datetime.timezone.utc)
+    # Shape of webdav4 Client.ls(detail=True) entries (DAVProperties.as_dict())
+    entry = {
+        'name': 'memes/cat.jpg', 'href': '/dav/memes/cat.jpg', 'content_length': 2048,
+        'created': None, 'modified': modified, 'content_language': None,
+        'content_type': 'image/jpeg', 'etag': '"abc"', 'type': 'file', 'display_name': None,
+    }
+    s = WebDavStorage('http://example')
+    s.client = FakeClient({'/': [entry]})
+
+    meta = s.list_files('/')[0]
+    assert meta['name'] == 'cat.jpg'
+    assert meta['is_dir'] is False
+    assert meta['size'] == 2048
+    assert meta['modified'] == modified
+
+
 def test_list_files_recursive_calls_subdir_and_merges_results():
     mapping = {
         '/root': [
@@ -137,6 +156,61 @@ def test_list_files_handles_mixed_entry_types():
     assert len(names) == 2
     
 
+_DEEP_PROPFIND_XML = """<?xml version="1.0"?>
+<d:multistatus xmlns:d="DAV:">
+  <d:response><d:href>/dav/root/</d:href><d:propstat><d:prop><d:resourcetype><d:collection/></d:resourcetype></d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>
+  <d:response><d:href>/dav/root/sub/</d:href><d:propstat><d:prop><d:resourcetype><d:collection/></d:resourcetype></d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>
+  <d:response><d:href>/dav/root/sub/a.jpg</d:href><d:propstat><d:prop><d:resourcetype/><d:getlastmodified>Wed, 01 Jan 2020 00:00:00 GMT</d:getlastmodified></d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>
+</d:multistatus>"""
+
+
+def _mock_webdav_storage(handler):
+    import httpx
+    from webdav4.client import Client
+
+    s = WebDavStorage('http://example/dav/')
+    s.client = Client('http://example/dav/', http_client=httpx.Client(base_url='http://example/dav/', transport=httpx.MockTransport(handler)))
+    return s
+
+
+def test_list_files_recursive_uses_single_deep_propfind():
+    import httpx
+
+    requests = []
+
+    def handler(request):
+        requests.append((request.method, request.headers.get('Depth')))
+        return httpx.Response(207, text=_DEEP_PROPFIND_XML)
+
+    s = _mock_webdav_storage(handler)
+    res = s.list_files('/root', recursive=True)
+
+    assert requests == [('PROPFIND', 'infinity')]
+    by_path = {r['path']: r for r in res}
+    assert set(by_path) == {'/root/sub', '/root/sub/a.jpg'}
+    assert by_path['/root/sub']['is_dir'] is True
+    assert by_path['/root/sub/a.jpg']['name'] == 'a.jpg'
+    assert by_path['/root/sub/a.jpg']['is_dir'] is False
+    assert 'modified' in by_path['/root/sub/a.jpg']
+
+
+def test_list_files_falls_back_to_per_directory_listing_when_deep_propfind_refused():
+    mapping = {
+        '/root': [{'name': 'subdir', 'type': 'directory'}],
+        '/root/subdir': [{'name': 'subfile.txt'}],
+    }
+
+    class NoInfinityClient(FakeClient):
+        def propfind(self, path, headers=None, **kwargs):
+            raise RuntimeError('403 propfind-finite-depth')
+
+    s = WebDavStorage('http://example')
+    s.client = NoInfinityClient(mapping)
+
+    paths = {r['path'] for r in s.list_files('/root', recursive=True)}
+    assert paths == {'/root/subdir', '/root/subdir/subfile.txt'}
+
+
 def test_download_file_returns_bytes_and_uses_leading_slash():
     s = WebDavStorage('http://example')
     s.client = FakeClientOpen(content=b'hello')
@@ -155,6 +229,16 @@ def test_download_file_returns_encoded_string_when_str_produced():
     assert out == 'text-ąćę'.encode('utf-8')
 
 
+@pytest.mark.parametrize("size_hint", [5, 3, 64])
+def test_download_file_with_size_hint_returns_full_content(size_hint):
+    s = WebDavStorage('http://example')
+    s.client = FakeClientOpen(content=b'hello')
+
+    out = s.download_file('/somefile', size_hint=size_hint)
+    assert out == b'hello'
+    assert type(out) is bytes
+
+
 def test_download_file_propagates_filenotfound_from_client():
     class FakeClient:
         def open(self, path, mode='rb'):
@@ -233,11 +317,10 @@ def test_extract_video_frame_success(monkeypatch):
     s = WebDavStorage('http://example')
     monkeypatch.setattr(WebDavStorage, 'download_file', lambda self, p: b'video-data')
     def fake_run(cmd, *args, **kwargs):
-        tmp_frame = cmd[-1]
-        with open(tmp_frame, 'wb') as f:
-            f.write(b'jpeg-data')
+        assert cmd[-1] == 'pipe:1'
         class R:
             returncode = 0
+            stdout = b'jpeg-data'
             stderr = b''
         return R()
     monkeypatch.setattr(subprocess, 'run', fake_run)
@@ -256,11 +339,10 @@ def test_extract_video_frame_fallback_on_short_video(monkeypatch):
                 stderr = b'Immediate exit requested'
             return R()
         else:
-            tmp_frame = cmd[-1]
-            with open(tmp_frame, 'wb') as f:
-                f.write(b'jpeg-fallback')
+            assert cmd[-1] == 'pipe:1'
             class R:
                 returncode = 0
+                stdout = b'jpeg-fallback'
                 stderr = b''
             return R()
     fake_run.calls = 0
@@ -306,6 +388,7 @@ def test_extract_video_frame_no_output_raises(monkeypatch):
     def fake_run(cmd, *args, **kwargs):
         class R:
             returncode = 0
+            stdout = b''
             stderr = b''
         return R()
     monkeypatch.setattr(subprocess, 'run', fake_run)
@@ -341,11 +424,10 @@ def test_extract_video_frame_unlink_exceptions_are_swallowed(monkeypatch):
     s = WebDavStorage('http://example')
     monkeypatch.setattr(WebDavStorage, 'download_file', lambda self, p: b'video-data')
     def fake_run(cmd, *args, **kwargs):
-        tmp_frame = cmd[-1]
-        with open(tmp_frame, 'wb') as f:
-            f.write(b'jpeg-ok')
+        assert cmd[-1] == 'pipe:1'
         class R:
             returncode = 0
+            stdout = b'jpeg-ok'
             stderr = b''
         return R()
     monkeypatch.setattr(subprocess, 'run', fake_run)
@@ -402,3 +484,61 @@ def test_delete_file_raises_ioerror_on_other_exception():
 
     with pytest.raises(IOError):
         s.delete_file('/noexist')
+
+
+def test_delete_files_collects_failures_by_path():
+    s = WebDavStorage('http://example')
+    s.client = FakeClient({}, remove_fail_exc=Exception('404 Not Found'))
+
+    errors = s.delete_files(['/a', '/b'])
+    assert sorted(errors) == ['/a', '/b']
+    assert all(isinstance(e, FileNotFoundError) for e in errors.values())
+
+
+def test_extract_video_frame_seeks_before_input_and_falls_back_on_empty_output(monkeypatch):
+    s = WebDavStorage('http://example')
+    monkeypatch.setattr(WebDavStorage, 'download_file', lambda self, p: b'video-data')
+    cmds = []
+    def fake_run(cmd, *args, **kwargs):
+        cmds.append(cmd)
+        class R:
+            returncode = 0
+            # input seek beyond a short video exits cleanly with no frame
+            stdout = b'' if len(cmds) == 1 else b'first-frame'
+            stderr = b''
+        return R()
+    monkeypatch.setattr(subprocess, 'run', fake_run)
+
+    assert s.extract_video_frame('short.mp4', timestamp=10.0) == b'first-frame'
+    assert cmds[0].index('-ss') < cmds[0].index('-i')
+    assert '-an' in cmds[0]
+    assert '-ss' not in cmds[1]
+
+
+def test_extract_video_frame_scales_down_when_max_dim_given(monkeypatch):
+    s = WebDavStorage('http://example')
+    monkeypatch.setattr(WebDavStorage, 'download_file', lambda self, p: b'video-data')
+    cmds = []
+    def fake_run(cmd, *args, **kwargs):
+        cmds.append(cmd)
+        class R:
+            returncode = 0
+            stdout = b'frame'
+            stderr = b''
+        return R()
+    monkeypatch.setattr(subprocess, 'run', fake_run)
+
+    s.extract_video_frame('video.mp4', timestamp=1.0)
+    assert '-vf' not in cmds[0]
+
+    s.extract_video_frame('video.mp4', timestamp=1.0, max_dim=256)
+    vf = cmds[1][cmds[1].index('-vf') + 1]
+    assert vf == "scale='min(256,iw)':-2"
+    assert cmds[1].index('-vf') < cmds[1].index('pipe:1')
+
+
+def test_webdav_storage_sizes_connection_pool_to_workers():
+    s = WebDavStorage('http://example', max_connections=4)
+    pool = s.client.http._transport._pool
+    assert pool._max_keepalive_connections == 4
+    assert pool._max_connections == 8
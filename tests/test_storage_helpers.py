@@ -111,7 +111,7 @@ def test_compute_and_persist_phash_video_extract_failure(monkeypatch):
     class VideoStorage:
         VIDEO_EXTENSIONS = ['mp4']
 
-        async def async_extract_video_frame(self, filename, timestamp=1.0):
+        async def async_extract_video_frame(self, filename, timestamp=1.0, max_dim=None):
             raise RuntimeError('ffmpeg fail')
 
     monkeypatch.setattr(storage_helpers, '_db_readonly_detected', False)
@@ -199,7 +199,9 @@ def test_compute_and_persist_phash_commit_retries_then_succeeds(monkeypatch):
     monkeypatch.setattr(storage_helpers, 'calculate_phash', lambda data: 'phashR')
     monkeypatch.setattr(storage_helpers, '_db_readonly_detected', False)
     # avoid sleeping delays
-    monkeypatch.setattr(storage_helpers, 'time', type('T', (), {'sleep': lambda *_: None}))
+    async def no_sleep(*_):
+        pass
+    monkeypatch.setattr(storage_helpers.asyncio, 'sleep', no_sleep)
 
     class S:
         def download_file(self, f):
@@ -274,7 +276,7 @@ def test_compute_and_persist_phash_video_extract_returns_str(monkeypatch):
     class VideoStorage2:
         VIDEO_EXTENSIONS = ['mp4']
 
-        async def async_extract_video_frame(self, filename, timestamp=1.0):
+        async def async_extract_video_frame(self, filename, timestamp=1.0, max_dim=None):
             return 'frame-str'
 
     monkeypatch.setattr(storage_helpers, '_db_readonly_detected', False)
@@ -344,3 +346,53 @@ def test_compute_and_persist_phash_commit_sets_flag_on_readonly_in_message(monke
     assert got is None
     assert storage_helpers._db_readonly_detected is True
 
+
+
+def test_compute_and_persist_phash_reuses_cached_phash_for_same_content(monkeypatch):
+    storage = SyncStorage(b'same-bytes')
+    monkeypatch.setattr(storage_helpers, '_db_readonly_detected', False)
+    calls = []
+
+    def counting_phash(data):
+        calls.append(data)
+        return 'phashC'
+    monkeypatch.setattr(storage_helpers, 'calculate_phash', counting_phash)
+
+    with make_engine() as eng:
+        from sqlmodel import Session
+        with Session(eng) as s:
+            s.add_all([Meme(filename='c1.png'), Meme(filename='c2.png')])
+            s.commit()
+
+        assert asyncio.run(storage_helpers.compute_and_persist_phash('c1.png', storage, eng)) == 'phashC'
+        assert asyncio.run(storage_helpers.compute_and_persist_phash('c2.png', storage, eng)) == 'phashC'
+        assert len(calls) == 1
+
+        with Session(eng) as s:
+            m2 = s.exec(select(Meme).where(Meme.filename == 'c2.png')).first()
+            assert m2.phash == 'phashC'
+
+
+def test_compute_and_persist_phashes_persists_batch(monkeypatch):
+    class PerFileStorage:
+        def download_file(self, path):
+            return None if path == 'empty.png' else path.encode()
+
+    monkeypatch.setattr(storage_helpers, '_db_readonly_detected', False)
+    monkeypatch.setattr(storage_helpers, 'calculate_phash', lambda data: 'ffffffffffffffff' if data == b'a.png' else '0000000000000001')
+
+    with make_engine() as eng:
+        from sqlmodel import Session
+        with Session(eng) as s:
+            s.add_all([Meme(filename='a.png'), Meme(filename='b.png'), Meme(filename='empty.png')])
+            s.commit()
+
+        got = asyncio.run(storage_helpers.compute_and_persist_phashes(
+            ['a.png', 'b.png', 'empty.png', 'missing.png'], PerFileStorage(), eng, concurrency=2))
+        assert got == {'a.png': 'ffffffffffffffff', 'b.png': '0000000000000001', 'empty.png': None, 'missing.png': None}
+
+        with Session(eng) as s:
+            rows = {m.filename: (m.phash, m.phash_bits) for m in s.exec(select(Meme))}
+        assert rows['a.png'] == ('ffffffffffffffff', -1)
+        assert rows['b.png'] == ('0000000000000001', 1)
+        assert rows['empty.png'] == (None, None)
@@ -192,6 +192,32 @@ def test_concurrency_limit():
     pool.shutdown()
 
 
+def test_semaphore_skipped_when_cap_matches_workers():
+    import threading, time
+
+    record = []
+    lock = threading.Lock()
+    current = [0]
+
+    def work(_):
+        with lock:
+            current[0] += 1
+            record.append(current[0])
+        time.sleep(0.05)
+        with lock:
+            current[0] -= 1
+        return threading.current_thread().name
+
+    pool = StorageWorkerPool(storage_adapter=object(), max_workers=2)
+    assert pool._semaphore is None
+
+    futures = [pool.submit(work, i) for i in range(4)]
+    assert all(f.result() for f in futures)
+    assert max(record) == 2
+
+    pool.shutdown()
+
+
 def test_async_upload_fileobj():
     class U:
         def __init__(self):
@@ -254,6 +280,37 @@ def test_async_run_no_timeout_returns():
     pool.shutdown()
 
 
+def test_async_run_reads_completed_future_without_wrapping(monkeypatch):
+    from concurrent.futures import Future
+    from llm_memedescriber import storage_workers
+
+    pool = StorageWorkerPool(storage_adapter=object())
+
+    def done_submit(fn, *args, **kwargs):
+        fut = Future()
+        try:
+            fut.set_result(fn(*args, **kwargs))
+        except Exception as exc:
+            fut.set_exception(exc)
+        return fut
+
+    def no_wrap(*a, **k):
+        raise AssertionError('wrap_future should not be used for a finished call')
+
+    monkeypatch.setattr(pool, 'submit', done_submit)
+    monkeypatch.setattr(storage_workers.asyncio, 'wrap_future', no_wrap)
+
+    assert asyncio.run(pool.async_run(lambda x: x * 2, 21)) == 42
+
+    def boom():
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(pool.async_run(boom))
+
+    pool.shutdown()
+
+
 def test_async_list_timeout():
     import time
 
@@ -328,3 +385,42 @@ def test_run_timeout_raises():
         pool.run(storage.slow, 'a', timeout=0.01)
 
     pool.shutdown()
+
+
+def test_bulk_download_and_delete_use_one_task_per_chunk():
+    class S:
+        def __init__(self):
+            self.deleted = []
+
+        def download_file(self, path):
+            if path == 'bad':
+                raise RuntimeError('boom')
+            return path.encode()
+
+        def delete_file(self, path):
+            if path == 'bad':
+                raise FileNotFoundError(path)
+            self.deleted.append(path)
+
+    storage = S()
+    pool = StorageWorkerPool(storage_adapter=storage, max_workers=2)
+    submitted = []
+    orig_submit = pool.submit
+
+    def counting_submit(fn, *args, **kwargs):
+        submitted.append(args)
+        return orig_submit(fn, *args, **kwargs)
+
+    pool.submit = counting_submit
+
+    paths = ['a', 'b', 'bad', 'c', 'd']
+    data, errors = pool.download_files(paths, chunk=2)
+    assert len(submitted) == 3
+    assert data == {'a': b'a', 'b': b'b', 'c': b'c', 'd': b'd'}
+    assert isinstance(errors['bad'], RuntimeError)
+
+    errors = asyncio.run(pool.async_delete_files(paths, chunk=4))
+    assert sorted(storage.deleted) == ['a', 'b', 'c', 'd']
+    assert list(errors) == ['bad']
+
+    pool.shutdown()